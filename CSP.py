@@ -1,113 +1,514 @@
+import math
+import random
+import time
+from collections import OrderedDict, deque
 import numpy as np
+from board import Board
+from solver_stats import reset_stats
+from techniques import Propagator
+
+
+def make_peers(n):
+    # cells sharing a row, column or n x n block, for an (n*n) x (n*n) board
+    size = n * n
+    return {
+        (r, c): [(i, j) for i in range(size) for j in range(size)
+                 if (i, j) != (r, c) and (i == r or j == c or (i // n == r // n and j // n == c // n))]
+        for r in range(size) for c in range(size)
+    }
+
+
+# Peers of every cell by box size; the 9x9 table is computed once at import
+PEERS_BY_BOX = {3: make_peers(3)}
+PEERS = PEERS_BY_BOX[3]
+
+
+def get_peers(n):
+    if n not in PEERS_BY_BOX:
+        PEERS_BY_BOX[n] = make_peers(n)
+    return PEERS_BY_BOX[n]
+
+
+# Domains are int bitsets, bit v - 1 set when value v is possible
+def domain_values(domain):
+    while domain:
+        bit = domain & -domain
+        domain ^= bit
+        yield bit.bit_length()
+
+
+def domain_size(domain):
+    return bin(domain).count("1")
+
+
+# Branching heuristics of SudokoCSP:
+#   mrv         fewest remaining values
+#   mrv_degree  fewest remaining values, ties to the most unassigned neighbours
+#   dom_wdeg    smallest domain size / weight of the cell's row, column and box,
+#               a unit's weight growing every time propagation fails in it
+#   lex         values in increasing order
+#   lcv         least constraining value first: the one that leaves the
+#               unassigned neighbours the most options
+#   random      values in random order
+VARIABLE_ORDERS = ("mrv", "mrv_degree", "dom_wdeg")
+VALUE_ORDERS = ("lex", "lcv", "random")
+# Every restart allows this many times more nodes than the one before
+RESTART_GROWTH = 1.5
+# Nogoods learned by the backjumping search: conflicts of more decisions
+# than NOGOOD_SIZE are not kept, and past MAX_NOGOODS the one unused the
+# longest is dropped
+NOGOOD_SIZE = 16
+MAX_NOGOODS = 10000
+
+
+class Restart(Exception):
+    """Raised inside dfs when the node budget of the current run is used up"""
+
 
 class SudokoCSP() :
-    def __init__(self, grid):
+    def __init__(self, grid, incremental=True, stats=None, techniques=None,
+                 variable_order="mrv", value_order="lex", restart_nodes=None, seed=None,
+                 backjump=False, nogood_size=NOGOOD_SIZE, max_nogoods=MAX_NOGOODS):
+        # the search indexes the grid NumPy style, so a Board is searched
+        # through its array view and still gets the solution in place
+        if isinstance(grid, Board):
+            grid = grid.array()
         self.grid = grid
+        # board is size x size with n x n blocks
+        self.size = len(grid)
+        self.n = math.isqrt(self.size)
+        self.peers = get_peers(self.n)
+        # only propagate from the cell just assigned during search
+        self.incremental = incremental
+        # counters from solver_stats, only collected when a dict is given
+        self.stats = reset_stats(stats) if stats is not None else None
+        # names of techniques.TECHNIQUES to run after every AC-3 pass
+        self.techniques = Propagator(self.n, techniques) if techniques is not None else None
+        # branching heuristics, see VARIABLE_ORDERS and VALUE_ORDERS
+        if variable_order not in VARIABLE_ORDERS:
+            raise ValueError(f"unknown variable order {variable_order!r}, expected one of {list(VARIABLE_ORDERS)}")
+        if value_order not in VALUE_ORDERS:
+            raise ValueError(f"unknown value order {value_order!r}, expected one of {list(VALUE_ORDERS)}")
+        self.variable_order = variable_order
+        self.value_order = value_order
+        # with a node budget the search restarts from the root whenever a run
+        # uses it up, with random tie-breaking and a budget RESTART_GROWTH
+        # times larger; dom/wdeg weights carry over between runs
+        self.restart_nodes = restart_nodes
+        self.budget = None
+        self.run_nodes = 0
+        self.random = random.Random(seed)
+        self.randomize = restart_nodes is not None or value_order == "random"
+        # conflict weight of every row, column and box (dom/wdeg only)
+        self.weights = [1] * (3 * self.size) if variable_order == "dom_wdeg" else None
+        # conflict-directed backjumping with nogood learning, see dfs
+        self.backjump = backjump
+        self.nogood_size = nogood_size
+        self.max_nogoods = max_nogoods
+        # nogood id -> tuple of (variable, value) that cannot all hold at once,
+        # least recently used first, and every assignment's nogoods by id
+        self.nogoods = OrderedDict()
+        self.watches = {}
+        self.next_nogood = 0
+        # (variable, value) decided at every level of the current path
+        self.decisions = {}
+        # levels of the decisions on the current path, as a bitset
+        self.open_levels = 0
+        # culprits of the last failed propagation
+        self.failure = 0
+        # solutions found so far, subtrees holding one learn no nogood
+        self.solutions = 0
+        if backjump and self.stats is not None:
+            self.stats.update(backjumps=0, nogoods=0, nogood_prunes=0)
         
         # variables are all empty cells 
-        self.variables = [(r,c) for r in range(9) for c in range(9) if grid[r][c] == 0]
+        self.variables = [(r,c) for r in range(self.size) for c in range(self.size) if grid[r][c] == 0]
         
-        self.domains = {var: set(x for x in range(1, 10)) for var in self.variables}
+        all_values = (1 << self.size) - 1
+        self.domains = {var: all_values for var in self.variables}
+        # empty cells not assigned by the search yet
+        self.unassigned = set(self.variables)
+        self.neighbors = {}
+        # (variable, value bit) removals, undone on backtrack
+        self.trail = []
+        # with backjumping, the decision levels (a bitset) whose assignments
+        # removed values from each variable, saved next to the trail
+        self.culprits = {var: 0 for var in self.variables} if backjump else None
+        self.saved = []
 
-        # Enforce node consistency
-        for i in range(9):
-            for j in range(9):
+        # Enforce node consistency; givens sharing a value with a given
+        # peer leave the puzzle without solutions
+        self.givens_conflict = False
+        for i in range(self.size):
+            for j in range(self.size):
                 pair = (i, j)
                 val = self.grid[i][j]
                 if val != 0:
-                    for var in self.domains.keys():
-                        if var[0] == i or var[1] == j or self.same_block(var, pair) : 
-                            self.domains[var].discard(val)
+                    for var in self.peers[pair]:
+                        if var in self.domains:
+                            self.domains[var] &= ~(1 << (int(val) - 1))
+                        elif self.grid[var[0]][var[1]] == val:
+                            self.givens_conflict = True
     
     def same_block(self, a, b):
-            xa = a[0] // 3
-            ya = a[1] // 3
-            xb = b[0] // 3
-            yb = b[1] // 3
+            xa = a[0] // self.n
+            ya = a[1] // self.n
+            xb = b[0] // self.n
+            yb = b[1] // self.n
             return xa == xb and ya == yb
 
     def get_neighbors(self, z):
-        return [v for v in self.variables if v != z and
-              (v[0] == z[0] or v[1] == z[1] or self.same_block(z, v))]
+        neighbors = self.neighbors.get(z)
+        if neighbors is None:
+            neighbors = [v for v in self.peers[z] if v in self.domains]
+            self.neighbors[z] = neighbors
+        return neighbors
     
-    # Check arc consistency
+    # Check arc consistency: y keeps a value other than x
     def is_consistent(self, x, y):
-        for z in self.domains[y]:
-            if z != x:return True
-        return False
+        return self.domains[y] & ~(1 << (x - 1)) != 0
     
     def is_valid(self, r, c, val):
         if val in self.grid[r]:
             return False
         if val in self.grid[:, c]:
             return False
-        br, bc = 3 * (r // 3), 3 * (c // 3)
-        if val in self.grid[br:br+3, bc:bc+3]:
+        n = self.n
+        br, bc = n * (r // n), n * (c // n)
+        if val in self.grid[br:br+n, bc:bc+n]:
             return False
         return True
     
+    # Remove values (a bitset) from a domain and remember them on the trail;
+    # reason is the decision levels responsible, all open ones when not known
+    def prune(self, var, bits, reason=None):
+        self.domains[var] &= ~bits
+        self.trail.append((var, bits))
+        if self.culprits is not None:
+            self.saved.append(self.culprits[var])
+            self.culprits[var] |= self.open_levels if reason is None else reason
+        if self.stats is not None:
+            self.stats["pruned"] += domain_size(bits)
+
+    # Put back every value removed since the trail had length mark
+    def undo(self, mark):
+        while len(self.trail) > mark:
+            var, bits = self.trail.pop()
+            self.domains[var] |= bits
+            if self.culprits is not None:
+                self.culprits[var] = self.saved.pop()
+
     # Enforce arc consistency between a and b
     def revise(self, a, b):
-        revised = False
-        for v in self.domains[a].copy():
-            if not self.is_consistent(v, b):
-                self.domains[a].discard(v)
-                revised = True
-
-        return revised
+        if self.stats is not None:
+            self.stats["revise_calls"] += 1
+        # a value of a only loses its support when b has no other value,
+        # so only a domain of b with at most one value can remove anything
+        domain_b = self.domains[b]
+        if domain_b & (domain_b - 1):
+            return False
+        removed = self.domains[a] & domain_b if domain_b else self.domains[a]
+        if removed:
+            # a loses the values because b is down to one, for b's reasons
+            self.prune(a, removed, self.culprits[b] if self.culprits is not None else None)
+            return True
+        return False
 
     
-    # Enforce arc consistency across all variables
-    def ac3(self):
-        queue = [(a,b) for a in self.variables for b in self.get_neighbors(a)]
+    # Enforce arc consistency across all variables, or only from the
+    # arcs pointing at the changed variables when they are given
+    def ac3(self, changed=None):
+        if changed is None:
+            queue = deque((a,b) for a in self.variables for b in self.get_neighbors(a))
+        else:
+            queue = deque((a,b) for b in changed for a in self.get_neighbors(b))
+        # arcs currently waiting in the queue, so the same arc is never queued twice
+        queued = set(queue)
 
-        while(len(queue) != 0):
-            pair = queue.pop(0)
+        while queue:
+            pair = queue.popleft()
+            queued.discard(pair)
             a, b = pair
             if self.revise(a,b):
-                if len(self.domains[a]) == 0:
+                if self.domains[a] == 0:
+                    if self.weights is not None:
+                        self.add_conflict(a, b)
+                    if self.culprits is not None:
+                        self.failure = self.culprits[a]
                     return False
                 for c in self.get_neighbors(a):
-                    if (c != b):
+                    if c != b and (c, a) not in queued:
                         queue.append((c,a))
+                        queued.add((c,a))
         return True
     
-    def dfs(self, current_domains):
-            empty = [v for v in self.variables if self.grid[v[0], v[1]] == 0]
-            if not empty:
+    # Alternate the enabled techniques with AC-3 until neither prunes anything
+    def apply_techniques(self):
+        while True:
+            changed = self.techniques.run(self.domains, self.prune)
+            if changed is None:
+                self.failure = self.open_levels
+                return False
+            if not changed:
                 return True
+            if not self.ac3(list(changed)):
+                return False
+
+    # ac3 (and techniques), timed when collecting stats
+    def propagate(self, changed=None):
+        if self.stats is not None:
+            start = time.perf_counter_ns()
+        consistent = self.ac3(changed)
+        if consistent and self.techniques is not None:
+            consistent = self.apply_techniques()
+        if self.stats is not None:
+            self.stats["propagation_ns"] += time.perf_counter_ns() - start
+        return consistent
+
+    # Row, column and box of a cell as indexes into self.weights
+    def units(self, var):
+        r, c = var
+        return r, self.size + c, 2 * self.size + (r // self.n) * self.n + c // self.n
 
-            r, c = min(empty, key=lambda v: len(current_domains[v]))
-
-            for val in sorted(current_domains[(r, c)]):
-                if self.is_valid(r, c, val):
-                    self.grid[r, c] = val
-                    
-                    local_domains = {v: d.copy() for v, d in current_domains.items()}
-                    local_domains[(r, c)] = {val}
-                    
-                    original_domains = self.domains
-                    self.domains = local_domains
-                    
-                    if self.ac3():
-                        if self.dfs(local_domains):
-                            return True
-                    
-                    self.domains = original_domains
-                    
+    # Propagation emptied the domain of a while revising it against b
+    def add_conflict(self, a, b):
+        for unit_a, unit_b in zip(self.units(a), self.units(b)):
+            if unit_a == unit_b:
+                self.weights[unit_a] += 1
+
+    def degree(self, var):
+        return sum(1 for v in self.get_neighbors(var) if v in self.unassigned)
+
+    def select_variable(self):
+        domains = self.domains
+        if self.variable_order == "mrv" and not self.randomize:
+            return min(self.unassigned, key=lambda v: domain_size(domains[v]))
+
+        if self.variable_order == "dom_wdeg":
+            weights = self.weights
+            scored = [(domain_size(domains[v]) / sum(weights[u] for u in self.units(v)), v)
+                      for v in self.unassigned]
+        else:
+            scored = [(domain_size(domains[v]), v) for v in self.unassigned]
+        best = min(score for score, _ in scored)
+        ties = [v for score, v in scored if score == best]
+        if len(ties) > 1 and self.variable_order == "mrv_degree":
+            degrees = [self.degree(v) for v in ties]
+            most = max(degrees)
+            ties = [v for v, degree in zip(ties, degrees) if degree == most]
+        return self.random.choice(ties) if self.randomize else ties[0]
+
+    def order_values(self, var):
+        values = list(domain_values(self.domains[var]))
+        if self.value_order == "lcv":
+            neighbors = [self.domains[v] for v in self.get_neighbors(var) if v in self.unassigned]
+            values.sort(key=lambda val: sum(1 for domain in neighbors if domain >> (val - 1) & 1))
+        elif self.value_order == "random":
+            self.random.shuffle(values)
+        return values
+
+    # Depth-first search below the current assignment. Yields self.grid at
+    # every solution and carries on searching when resumed; a generator that
+    # is closed or dropped at a solution leaves it in the grid.
+    #
+    # With backjumping every pruned value is blamed on the decisions that
+    # caused it (culprits), so when all values of a variable fail the search
+    # returns their conflict set (a bitset of levels) and unwinds straight to
+    # the latest decision in it, skipping the levels that played no part.
+    # The conflict set is also learned as a nogood when it is small enough.
+    def dfs(self, depth=1):
+            if not self.unassigned:
+                self.solutions += 1
+                yield self.grid
+                # a solution is no conflict, nothing above may be jumped over
+                return (1 << depth) - 2
+
+            if self.stats is not None:
+                self.stats["nodes"] += 1
+                self.stats["max_depth"] = max(self.stats["max_depth"], depth)
+            if self.budget is not None:
+                self.run_nodes += 1
+                if self.run_nodes > self.budget:
+                    raise Restart
+
+            var = self.select_variable()
+            self.unassigned.discard(var)
+            r, c = var
+            level = 1 << depth
+            backjump = self.culprits is not None
+            # values already gone from the domain were removed by these
+            conflict = self.culprits[var] if backjump else 0
+            found = self.solutions
+
+            for val in self.order_values(var):
+                if not self.is_valid(r, c, val):
+                    conflict |= level - 2
+                    continue
+                self.grid[r, c] = val
+
+                mark = len(self.trail)
+                others = self.domains[var] & ~(1 << (val - 1))
+                if others:
+                    self.prune(var, others, level)
+                changed = []
+                if backjump:
+                    self.decisions[depth] = (var, val)
+                    self.open_levels = (level << 1) - 2
+                    if others:
+                        # var = val is down to this decision alone
+                        self.culprits[var] = level
+                    changed = self.check_nogoods((var, val))
+
+                if changed is None:
+                    consistent = False
+                elif self.incremental:
+                    consistent = self.propagate([var] + changed)
+                else:
+                    consistent = self.propagate()
+
+                if consistent:
+                    jump = yield from self.dfs(depth + 1)
+                    if backjump and not jump & level:
+                        # this decision is not to blame, so its other values
+                        # would fail the same way: keep unwinding
+                        if self.stats is not None:
+                            self.stats["backjumps"] += 1
+                        self.undo(mark)
+                        self.grid[r, c] = 0
+                        self.unassigned.add(var)
+                        return jump
+                    conflict |= jump & ~level
+                else:
+                    conflict |= self.failure & ~level
+
+                if self.stats is not None:
+                    self.stats["backtracks"] += 1
+                self.undo(mark)
+
+                self.grid[r, c] = 0
+            self.unassigned.add(var)
+            # a subtree that held solutions did not fail, there is nothing to learn
+            if backjump and self.solutions == found:
+                self.learn(conflict)
+            return conflict
+
+    # Keep the decisions of a conflict set as a nogood
+    def learn(self, conflict):
+        literals = []
+        while conflict:
+            bit = conflict & -conflict
+            conflict ^= bit
+            literals.append(self.decisions[bit.bit_length() - 1])
+        if not literals or len(literals) > self.nogood_size:
+            return
+        literals = tuple(literals)
+        ident = self.next_nogood
+        self.next_nogood += 1
+        self.nogoods[ident] = literals
+        for literal in literals:
+            self.watches.setdefault(literal, set()).add(ident)
+        if len(self.nogoods) > self.max_nogoods:
+            old, old_literals = self.nogoods.popitem(last=False)
+            for literal in old_literals:
+                self.watches[literal].discard(old)
+        if self.stats is not None:
+            self.stats["nogoods"] += 1
+
+    # Check the nogoods of a decision just made. A nogood whose assignments
+    # now all hold is a failure (returns None); one with a single assignment
+    # left open rules that one out. Returns the variables pruned.
+    def check_nogoods(self, literal):
+        changed = []
+        for ident in list(self.watches.get(literal, ())):
+            reason = 0
+            open_literal = None
+            for var, val in self.nogoods[ident]:
+                domain = self.domains[var]
+                bit = 1 << (val - 1)
+                if not domain & bit:
+                    break
+                if domain == bit:
+                    reason |= self.culprits[var]
+                elif open_literal is None:
+                    open_literal = (var, bit)
+                else:
+                    break
+            else:
+                self.nogoods.move_to_end(ident)
+                if self.stats is not None:
+                    self.stats["nogood_prunes"] += 1
+                if open_literal is None:
+                    self.failure = reason
+                    return None
+                var, bit = open_literal
+                self.prune(var, bit, reason)
+                if not self.domains[var]:
+                    self.failure = self.culprits[var]
+                    return None
+                changed.append(var)
+        return changed
+
+    # The first solution of dfs, left in the grid; whether there was one
+    def search(self):
+        return next(self.dfs(), None) is not None
+
+    # Fill self.grid with every solution in turn; the grid is back to the
+    # puzzle once the generator finishes or is closed. There are no restarts
+    # here, one would only find the solutions already yielded again
+    def iter_solutions(self):
+        mark = len(self.trail)
+        try:
+            if not self.givens_conflict and self.propagate():
+                yield from self.dfs()
+        finally:
+            self.undo(mark)
+            for r, c in self.variables:
+                self.grid[r, c] = 0
+            self.unassigned = set(self.variables)
+
+    # dfs from the root again and again, the node budget growing by
+    # RESTART_GROWTH after every restart, until a run finishes
+    def restarting_dfs(self):
+        mark = len(self.trail)
+        budget = self.restart_nodes
+        restarts = 0
+        while True:
+            self.budget = budget
+            self.run_nodes = 0
+            try:
+                solved = self.search()
+                break
+            except Restart:
+                self.undo(mark)
+                for r, c in self.variables:
                     self.grid[r, c] = 0
-            return False
+                self.unassigned = set(self.variables)
+                restarts += 1
+                budget = int(budget * RESTART_GROWTH) + 1
+        self.budget = None
+        if self.stats is not None:
+            self.stats["restarts"] = restarts
+        return solved
 
-    def solve(self):
+    def solve(self, verbose=True):
         # initial ac3
-        if not self.ac3():
-            print("Not solvable")
+        if self.givens_conflict or not self.propagate():
+            if verbose:
+                print("Not solvable")
             return False
         
         # dfs + lookahead
-        if self.dfs(self.domains): 
-            print(self.grid)
-            return True
-        else:
-            print("Not solvable")
-            return False
+        if self.stats is not None:
+            start = time.perf_counter_ns()
+            propagation_before = self.stats["propagation_ns"]
+        solved = self.restarting_dfs() if self.restart_nodes is not None else self.search()
+        if self.stats is not None:
+            propagation = self.stats["propagation_ns"] - propagation_before
+            self.stats["search_ns"] = time.perf_counter_ns() - start - propagation
+
+        if self.stats is not None and self.techniques is not None:
+            self.stats["techniques"] = dict(self.techniques.fired)
+
+        if verbose:
+            print(self.grid if solved else "Not solvable")
+        return solved
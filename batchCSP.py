@@ -0,0 +1,114 @@
+import numpy as np
+
+# Constraint propagation over many puzzles at once. The candidates of N
+# puzzles are one (N, 9, 9, 9) boolean array: cand[n, r, c, d] is True when
+# digit d + 1 is still possible in cell (r, c) of puzzle n. Naked and hidden
+# singles are applied to every puzzle with whole-array row, column and box
+# reductions, and only the puzzles left unresolved go to a per-puzzle search.
+
+
+def to_candidates(grids):
+    grids = np.asarray(grids, dtype=np.int8).reshape(-1, 9, 9)
+    cand = np.ones(grids.shape + (9,), dtype=bool)
+    given = grids > 0
+    cand[given] = np.eye(9, dtype=bool)[grids[given] - 1]
+    return cand
+
+
+def to_grids(cand):
+    # cells with exactly one candidate get its digit, the rest stay 0
+    single = cand.sum(axis=3) == 1
+    return np.where(single, cand.argmax(axis=3) + 1, 0).astype(np.int8)
+
+
+def boxes(x):
+    # (N, 9, 9, 9) -> (N, band, row, stack, col, 9)
+    return x.reshape(-1, 3, 3, 3, 3, 9)
+
+
+def unit_any(x):
+    """For every cell and digit, whether the digit is set anywhere in its row, column or box"""
+    row = x.any(axis=2, keepdims=True)
+    col = x.any(axis=1, keepdims=True)
+    box = boxes(x).any(axis=(2, 4), keepdims=True)
+    return row, col, np.broadcast_to(box, boxes(x).shape).reshape(x.shape)
+
+
+def unit_counts(x):
+    # (N, 9 units, 9 digits) counts for rows, columns and boxes
+    box = boxes(x).transpose(0, 1, 3, 2, 4, 5).reshape(-1, 9, 9, 9)
+    return x.sum(axis=2), x.sum(axis=1), box.sum(axis=2)
+
+
+def propagate(cand, max_rounds=81):
+    """Apply naked and hidden singles in place until nothing changes
+
+    Returns a boolean array marking the puzzles that ran into a contradiction
+    """
+    failed = np.zeros(len(cand), dtype=bool)
+    active = np.ones(len(cand), dtype=bool)
+
+    for _ in range(max_rounds):
+        idx = np.flatnonzero(active & ~failed)
+        if len(idx) == 0:
+            break
+        c = cand[idx]
+        before = c.copy()
+
+        # Naked singles: remove the digit of every solved cell from its peers
+        singles = c & (c.sum(axis=3) == 1)[..., None]
+        bad = (c.sum(axis=3) == 0).any(axis=(1, 2))
+        for counts in unit_counts(singles):
+            # the same digit solved twice in a unit
+            bad |= (counts > 1).any(axis=(1, 2))
+        for seen in unit_any(singles):
+            c &= ~seen | singles
+
+        # Hidden singles: a digit with one place left in a unit goes there
+        for counts, axis in zip(unit_counts(c), ("row", "col", "box")):
+            bad |= (counts == 0).any(axis=(1, 2))
+            once = counts == 1
+            if axis == "row":
+                hidden = c & once[:, :, None, :]
+            elif axis == "col":
+                hidden = c & once[:, None, :, :]
+            else:
+                once = np.broadcast_to(once.reshape(-1, 3, 1, 3, 1, 9), boxes(c).shape)
+                hidden = c & once.reshape(c.shape)
+            # one cell forced to two different digits
+            bad |= (hidden.sum(axis=3) > 1).any(axis=(1, 2))
+            c = np.where(hidden.any(axis=3, keepdims=True), hidden, c)
+
+        cand[idx] = c
+        failed[idx] |= bad
+        active[idx] = (c != before).any(axis=(1, 2, 3))
+
+    return failed
+
+
+def solve_batch(grids, solver=None):
+    """Solve a batch of puzzles, returning a list of solved grids or None
+
+    Puzzles that propagation alone does not finish are completed with
+    solver(grid), which fills a list of lists in place like
+    sudokuDFS.solve_sudoku (the default).
+    """
+    if solver is None:
+        from sudokuDFS import solve_sudoku as solver
+
+    cand = to_candidates(grids)
+    failed = propagate(cand)
+    solved = (cand.sum(axis=3) == 1).all(axis=(1, 2)) & ~failed
+    partial = to_grids(cand)
+
+    results = []
+    for n in range(len(cand)):
+        if failed[n]:
+            results.append(None)
+            continue
+        grid = partial[n].tolist()
+        if solved[n] or solver(grid):
+            results.append(grid)
+        else:
+            results.append(None)
+    return results
@@ -0,0 +1,148 @@
+import argparse
+import os
+import sys
+from collections import deque
+from itertools import islice
+from multiprocessing import Pool
+
+from board import Board
+from solution_cache import SolutionCache, cached_engine
+from sudoku_core import ENGINES
+
+# Solve puzzle files without the pygame app. Every input line is one puzzle
+# of 81 characters, row by row, with 0 or . for empty cells. Output has one
+# line per puzzle in the same order: the 81 digit solution, "unsolvable",
+# or "invalid" for lines that are not a puzzle.
+#
+#   python batch_solve.py puzzles.txt -e dlx -j 8 > solutions.txt
+#   cat puzzles.txt | python batch_solve.py -e csp
+#
+# Packed corpus files (corpus.py, .sdkc) are read through a memory map.
+
+
+# Solution caches of this process, one per engine, made on first use
+CACHES = {}
+
+
+def get_engine(engine, cache_size=0):
+    if not cache_size:
+        return ENGINES[engine]
+    cache = CACHES.get(engine)
+    if cache is None:
+        cache = CACHES[engine] = SolutionCache(cache_size)
+    return cached_engine(ENGINES[engine], cache)
+
+
+def parse_line(line):
+    line = line.strip()
+    if len(line) != 81:
+        return None
+    cells = bytearray(81)
+    for i, ch in enumerate(line):
+        if "1" <= ch <= "9":
+            cells[i] = ord(ch) - 48
+        elif ch != "." and ch != "0":
+            return None
+    return Board(9, cells)
+
+
+def format_grid(grid):
+    return "".join(str(num) for row in grid for num in row)
+
+
+def solve_line(engine, line, cache_size=0):
+    grid = parse_line(line)
+    if grid is None:
+        return "invalid"
+    if get_engine(engine, cache_size)(grid):
+        return format_grid(grid)
+    return "unsolvable"
+
+
+def solve_chunk(engine, lines, propagate=False, cache_size=0):
+    if not propagate:
+        return [solve_line(engine, line, cache_size) for line in lines]
+
+    # run naked/hidden singles on the whole chunk with NumPy, the engine
+    # only searches the puzzles that are left unresolved
+    from batchCSP import solve_batch
+
+    grids = [parse_line(line) for line in lines]
+    valid = [grid for grid in grids if grid is not None]
+    solutions = iter(solve_batch(valid, get_engine(engine, cache_size)) if valid else [])
+
+    results = []
+    for grid in grids:
+        if grid is None:
+            results.append("invalid")
+            continue
+        solution = next(solutions)
+        results.append(format_grid(solution) if solution is not None else "unsolvable")
+    return results
+
+
+def solve_stream(lines, engine="dfs", jobs=None, chunk_size=256, propagate=False, cache_size=0):
+    """Yield one result per input line, in input order"""
+    jobs = jobs or os.cpu_count() or 1
+    lines = (line for line in lines if line.strip())
+
+    if jobs == 1:
+        while True:
+            chunk = list(islice(lines, chunk_size))
+            if not chunk:
+                return
+            yield from solve_chunk(engine, chunk, propagate, cache_size)
+
+    # Keep at most 2 chunks per worker in flight so memory stays bounded
+    # however large the input is (Pool.imap would read all of it ahead)
+    max_pending = jobs * 2
+    with Pool(jobs) as pool:
+        pending = deque()
+        while True:
+            while len(pending) < max_pending:
+                chunk = list(islice(lines, chunk_size))
+                if not chunk:
+                    break
+                pending.append(pool.apply_async(solve_chunk, (engine, chunk, propagate, cache_size)))
+            if not pending:
+                break
+            yield from pending.popleft().get()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Solve Sudoku puzzles in batch")
+    parser.add_argument("input", nargs="?", default="-",
+                        help="puzzle file, one 81 character puzzle per line, or a .sdkc corpus (default: stdin)")
+    parser.add_argument("-o", "--output", default="-", help="output file (default: stdout)")
+    parser.add_argument("-e", "--engine", choices=sorted(ENGINES), default="dfs")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="worker processes (default: number of cores)")
+    parser.add_argument("--chunk-size", type=int, default=256,
+                        help="puzzles sent to a worker at a time")
+    parser.add_argument("--propagate", action="store_true",
+                        help="run vectorized singles propagation on each chunk before searching")
+    parser.add_argument("--cache", type=int, default=0, metavar="SIZE",
+                        help="solutions kept per worker in a symmetry-aware LRU cache (default: off)")
+    args = parser.parse_args(argv)
+
+    if args.input.endswith(".sdkc"):
+        from corpus import CorpusReader
+        infile = CorpusReader(args.input)
+        lines = infile.iter_lines()
+    else:
+        infile = sys.stdin if args.input == "-" else open(args.input)
+        lines = infile
+    outfile = sys.stdout if args.output == "-" else open(args.output, "w")
+    try:
+        for result in solve_stream(lines, args.engine, args.jobs, args.chunk_size,
+                                   args.propagate, args.cache):
+            outfile.write(result + "\n")
+    finally:
+        if infile is not sys.stdin:
+            infile.close()
+        if outfile is not sys.stdout:
+            outfile.close()
+
+
+if __name__ == "__main__":
+    main()
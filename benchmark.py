@@ -0,0 +1,225 @@
+import argparse
+import hashlib
+import json
+import platform
+import random
+import sys
+import time
+
+from batch_solve import format_grid
+from sudoku_core import ENGINES
+from sudoko import LEVELS, generate_full_grid, make_puzzle
+
+# Reproducible solver benchmark. Every difficulty gets a fixed corpus made by
+# make_puzzle from a seeded random generator, every engine solves every
+# puzzle after a warm-up, and latency percentiles and throughput are written
+# as JSON. Passing an earlier result with --compare flags regressions: p50
+# or p95 latency slower by more than --threshold and --min-delta, in the
+# run and in every --confirm re-run of the cases that regressed.
+#
+#   python benchmark.py -o baseline.json
+#   python benchmark.py -o new.json --compare baseline.json
+#
+# --corpus benchmarks puzzles from a packed corpus file (corpus.py) instead,
+# the first --size of every indexed difficulty, or of the whole file as
+# difficulty "all" when it has no index.
+
+PERCENTILES = (50, 95, 99)
+# Metrics a --compare fails on. p99 and max come from a puzzle or two and
+# move with scheduler noise, so by default they are only reported
+GATED_METRICS = ("p50_ms", "p95_ms")
+TAIL_METRICS = ("p99_ms", "max_ms")
+# Slowdowns smaller than this are noise whatever their relative size
+MIN_DELTA_MS = 0.5
+
+
+def make_corpus(difficulty, size, seed):
+    # one generator per difficulty so the corpora do not depend on each other
+    state = random.getstate()
+    random.seed(f"{seed}-{difficulty}")
+    try:
+        return [make_puzzle(generate_full_grid(), difficulty=difficulty) for _ in range(size)]
+    finally:
+        random.setstate(state)
+
+
+def load_corpus(reader, difficulty, size):
+    if difficulty == "all":
+        grids = reader.grids(0, size)
+    else:
+        grids = reader.take(reader.select(difficulty)[:size])
+    return grids.tolist()
+
+
+def corpus_digest(corpus):
+    digest = hashlib.sha256()
+    for puzzle in corpus:
+        digest.update(format_grid(puzzle).encode())
+    return digest.hexdigest()[:16]
+
+
+def percentile(sorted_values, p):
+    # nearest-rank percentile
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-p * len(sorted_values) // 100))
+    return sorted_values[rank - 1]
+
+
+def time_solve(solver, puzzle):
+    grid = [row[:] for row in puzzle]
+    start = time.perf_counter()
+    solved = solver(grid)
+    return time.perf_counter() - start, solved
+
+
+def bench_engine(solver, corpus, warmup, repeats):
+    for puzzle in corpus[:warmup]:
+        time_solve(solver, puzzle)
+
+    latencies = []
+    failures = 0
+    for puzzle in corpus:
+        # median of the repeats for every puzzle
+        runs = sorted(time_solve(solver, puzzle) for _ in range(repeats))
+        latency, solved = runs[len(runs) // 2]
+        latencies.append(latency)
+        failures += not solved
+
+    latencies.sort()
+    total = sum(latencies)
+    result = {f"p{p}_ms": percentile(latencies, p) * 1000 for p in PERCENTILES}
+    result["max_ms"] = latencies[-1] * 1000 if latencies else 0.0
+    result["mean_ms"] = total / len(latencies) * 1000 if latencies else 0.0
+    result["throughput_per_s"] = len(latencies) / total if total > 0 else 0.0
+    result["failures"] = failures
+    return result
+
+
+def run_benchmark(engines, difficulties, size, seed, warmup, repeats, log=None, corpus_file=None):
+    reader = None
+    if corpus_file is not None:
+        from corpus import CorpusReader
+        reader = CorpusReader(corpus_file)
+        if not reader.has_index:
+            difficulties = ["all"]
+
+    report = {
+        "config": {
+            "engines": list(engines),
+            "difficulties": list(difficulties),
+            "size": size,
+            "seed": seed,
+            "warmup": warmup,
+            "repeats": repeats,
+            "corpus_file": corpus_file,
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "machine": platform.machine(),
+        },
+        "corpora": {},
+        "results": {},
+    }
+
+    for difficulty in difficulties:
+        if reader is not None:
+            corpus = load_corpus(reader, difficulty, size)
+            if not corpus:
+                # the corpus file has no puzzles of this difficulty
+                continue
+        else:
+            corpus = make_corpus(difficulty, size, seed)
+        report["corpora"][difficulty] = corpus_digest(corpus)
+        for engine in engines:
+            result = bench_engine(ENGINES[engine], corpus, warmup, repeats)
+            report["results"].setdefault(engine, {})[difficulty] = result
+            if log:
+                log(f"{engine:4} {difficulty:7} p50 {result['p50_ms']:8.3f}ms  "
+                    f"p95 {result['p95_ms']:8.3f}ms  p99 {result['p99_ms']:8.3f}ms  "
+                    f"max {result['max_ms']:8.3f}ms  {result['throughput_per_s']:9.1f}/s")
+    if reader is not None:
+        reader.close()
+    return report
+
+
+def compare_reports(old, new, threshold=0.10, min_delta=MIN_DELTA_MS, metrics=GATED_METRICS, warn=True):
+    """Return the given latency metrics that got slower than old by more
+    than threshold and by at least min_delta milliseconds"""
+    regressions = []
+    warned = set()
+    for engine, by_difficulty in new["results"].items():
+        for difficulty, result in by_difficulty.items():
+            before = old.get("results", {}).get(engine, {}).get(difficulty)
+            if before is None:
+                continue
+            if warn and difficulty not in warned and \
+                    old.get("corpora", {}).get(difficulty) != new["corpora"].get(difficulty):
+                warned.add(difficulty)
+                print(f"Warning: {difficulty} corpus differs from the compared run", file=sys.stderr)
+            for metric in metrics:
+                if before[metric] > 0 and result[metric] > before[metric] * (1 + threshold) \
+                        and result[metric] - before[metric] >= min_delta:
+                    regressions.append((engine, difficulty, metric, before[metric], result[metric]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Sudoku engines")
+    parser.add_argument("-e", "--engines", nargs="+", choices=sorted(ENGINES), default=sorted(ENGINES))
+    parser.add_argument("-d", "--difficulties", nargs="+", choices=list(LEVELS), default=list(LEVELS))
+    parser.add_argument("-n", "--size", type=int, default=100, help="puzzles per difficulty")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--corpus", help="packed corpus file to take the puzzles from instead of generating them")
+    parser.add_argument("--warmup", type=int, default=10, help="puzzles solved before timing")
+    parser.add_argument("--repeats", type=int, default=3, help="timed solves per puzzle, the median is kept")
+    parser.add_argument("-o", "--output", default="benchmark.json")
+    parser.add_argument("--compare", help="earlier benchmark JSON to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="relative slowdown counted as a regression (default: 0.10)")
+    parser.add_argument("--min-delta", type=float, default=MIN_DELTA_MS, metavar="MS",
+                        help=f"smallest absolute slowdown counted as a regression (default: {MIN_DELTA_MS}ms)")
+    parser.add_argument("--gate-tail", action="store_true",
+                        help="also fail on p99 and max latency, which are only reported by default")
+    parser.add_argument("--confirm", type=int, default=1,
+                        help="times a regressed case is re-run, it only fails if every re-run is slower too (default: 1)")
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(args.engines, args.difficulties, args.size, args.seed,
+                           args.warmup, args.repeats, log=print, corpus_file=args.corpus)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        gated = GATED_METRICS + TAIL_METRICS if args.gate_tail else GATED_METRICS
+        regressions = compare_reports(old, report, args.threshold, args.min_delta, gated)
+        for _ in range(args.confirm):
+            if not regressions:
+                break
+            # a slowdown that does not show up again was noise
+            engines = sorted({engine for engine, *_ in regressions})
+            difficulties = sorted({difficulty for _, difficulty, *_ in regressions})
+            print(f"Re-running {', '.join(engines)} on {', '.join(difficulties)} to confirm the slowdowns")
+            rerun = run_benchmark(engines, difficulties, args.size, args.seed, args.warmup, args.repeats,
+                                  corpus_file=args.corpus)
+            confirmed = {regression[:3] for regression in
+                         compare_reports(old, rerun, args.threshold, args.min_delta, gated, warn=False)}
+            regressions = [regression for regression in regressions if regression[:3] in confirmed]
+        for engine, difficulty, metric, before, after in regressions:
+            print(f"REGRESSION {engine} {difficulty} {metric}: {before:.3f}ms -> {after:.3f}ms")
+        if not args.gate_tail:
+            tail = compare_reports(old, report, args.threshold, args.min_delta, TAIL_METRICS, warn=False)
+            for engine, difficulty, metric, before, after in tail:
+                print(f"slower (not gated) {engine} {difficulty} {metric}: {before:.3f}ms -> {after:.3f}ms")
+        if regressions:
+            return 1
+        print("No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
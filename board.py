@@ -0,0 +1,101 @@
+import math
+
+# Compact board shared by the engines, the batch tools and the GUI.
+#
+# A Board keeps its cells in one bytearray, row by row, one byte per cell
+# (0 for empty). board[r] is a memoryview of row r, so code written for a
+# list of lists (grid[r][c], grid[r][c] = v, len(grid), for row in grid)
+# works on a Board unchanged, and array() is a NumPy view of the same
+# bytes, so the CSP engine searches the board itself instead of a copy.
+
+
+class Board:
+    """size x size board stored in size * size bytes
+
+    A bytearray passed as cells is used as is, anything else is copied.
+    """
+
+    __slots__ = ("size", "cells")
+
+    def __init__(self, size=9, cells=None):
+        self.size = size
+        if cells is None:
+            cells = bytearray(size * size)
+        elif not isinstance(cells, bytearray):
+            cells = bytearray(cells)
+        self.cells = cells
+        if len(self.cells) != size * size:
+            raise ValueError(f"expected {size * size} cells, got {len(self.cells)}")
+
+    @classmethod
+    def from_grid(cls, grid):
+        """Board from a list of lists (or another Board)"""
+        if isinstance(grid, Board):
+            return grid.copy()
+        return cls(len(grid), bytes(v for row in grid for v in row))
+
+    @property
+    def box_size(self):
+        return math.isqrt(self.size)
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            r, c = key
+            return self.cells[r * self.size + c]
+        if isinstance(key, slice):
+            return [self[r] for r in range(self.size)[key]]
+        if key < 0:
+            key += self.size
+        if not 0 <= key < self.size:
+            raise IndexError("board row out of range")
+        return memoryview(self.cells)[key * self.size:(key + 1) * self.size]
+
+    def __setitem__(self, key, value):
+        if isinstance(key, tuple):
+            r, c = key
+            self.cells[r * self.size + c] = value
+        elif isinstance(key, slice) and key == slice(None):
+            # board[:] = rows, like refilling a list of lists in place
+            self.cells[:] = bytes(v for row in value for v in row)
+        else:
+            self[key][:] = bytes(value)
+
+    def __iter__(self):
+        view = memoryview(self.cells)
+        for r in range(0, self.size * self.size, self.size):
+            yield view[r:r + self.size]
+
+    def __eq__(self, other):
+        if isinstance(other, Board):
+            return self.size == other.size and self.cells == other.cells
+        return NotImplemented
+
+    def __repr__(self):
+        return f"Board({self.size}, {bytes(self.cells)!r})"
+
+    def __array__(self, dtype=None, copy=None):
+        array = self.array()
+        if dtype is not None and array.dtype != dtype:
+            return array.astype(dtype)
+        return array.copy() if copy else array
+
+    def copy(self):
+        return Board(self.size, bytearray(self.cells))
+
+    def tolist(self):
+        return [list(row) for row in self]
+
+    def array(self):
+        """Writable (size, size) uint8 NumPy view of the cells, no copy"""
+        import numpy as np
+        return np.frombuffer(self.cells, dtype=np.uint8).reshape(self.size, self.size)
+
+
+def copy_grid(grid):
+    """Independent copy of a Board or a list of lists, of the same type"""
+    if isinstance(grid, Board):
+        return grid.copy()
+    return [row[:] for row in grid]
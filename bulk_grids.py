@@ -0,0 +1,71 @@
+import random
+
+import numpy as np
+
+from sudoko import generate_full_grid
+
+# Solution grids in bulk. A pool of seed grids from generate_full_grid is
+# turned into new grids by random transforms that keep a grid valid, all
+# applied to a whole batch at once with NumPy: digit relabelling, rows
+# within bands, band order, columns within stacks, stack order and
+# transposition. One seed of the pool is replaced by a freshly generated
+# grid every batch, so a long stream does not keep drawing from the same
+# handful of essentially different grids.
+#
+#   for batch in full_grid_batches(100000):   # (batch_size, 9, 9) arrays
+#       ...
+
+
+def line_orders(rng, count, n):
+    """count random orders of n*n rows that keep every band's rows together"""
+    bands = rng.random((count, n)).argsort(axis=1)
+    within = rng.random((count, n, n)).argsort(axis=2)
+    return (bands[:, :, None] * n + within).reshape(count, n * n)
+
+
+def transform_grids(grids, rng, n=3):
+    """Apply an independent random validity-preserving transform to every grid of a (count, size, size) array"""
+    count, size, _ = grids.shape
+    picked = np.arange(count)[:, None]
+
+    # relabel the digits: digits[k, v - 1] is the new digit v becomes in grid k
+    digits = rng.random((count, size)).argsort(axis=1).astype(grids.dtype) + 1
+    grids = digits[picked, grids.reshape(count, -1) - 1].reshape(count, size, size)
+
+    grids = grids[picked, line_orders(rng, count, n)]
+    grids = grids[picked[:, :, None], np.arange(size)[None, :, None], line_orders(rng, count, n)[:, None, :]]
+
+    flip = rng.random(count) < 0.5
+    grids[flip] = grids[flip].transpose(0, 2, 1)
+    return grids
+
+
+def seed_grids(count, n=3, picker=random):
+    return np.array([generate_full_grid(n, picker) for _ in range(count)], dtype=np.uint8)
+
+
+def full_grid_batches(count=None, n=3, batch_size=4096, pool_size=64, seed=None):
+    """Yield (batch, n*n, n*n) uint8 arrays of valid solution grids
+
+    Stops after count grids in total, or never when count is None. A seed
+    makes the stream reproducible. The seed grids come from a random.Random
+    of the stream's own, so the random module is never touched.
+    """
+    rng = np.random.default_rng(seed)
+    picker = random.Random(seed)
+    # a short stream does not need more seeds than grids
+    pool_size = pool_size if count is None else max(1, min(pool_size, count))
+    pool = seed_grids(pool_size, n, picker)
+    produced = 0
+    while count is None or produced < count:
+        batch = batch_size if count is None else min(batch_size, count - produced)
+        grids = transform_grids(pool[rng.integers(0, pool_size, batch)], rng, n)
+        pool[produced // batch_size % pool_size] = generate_full_grid(n, picker)
+        produced += batch
+        yield grids
+
+
+def iter_full_grids(count=None, n=3, batch_size=4096, pool_size=64, seed=None):
+    """Yield valid solution grids one at a time as lists of lists, like generate_full_grid"""
+    for grids in full_grid_batches(count, n, batch_size, pool_size, seed):
+        yield from grids.tolist()
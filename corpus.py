@@ -0,0 +1,297 @@
+import argparse
+import mmap
+import random
+import struct
+import sys
+
+import numpy as np
+
+from board import Board
+from bulk_grids import iter_full_grids
+from sudoko import LEVELS, generate_unique_puzzle, make_puzzle, rate_puzzle
+
+# Packed puzzle corpus. A file is a 32 byte header followed by fixed-size
+# records, one per puzzle. A record holds the cells row by row at 4 bits
+# per cell, two cells per byte with the first cell in the high nibble, and
+# when the header's index flag is set also the puzzle's difficulty and the
+# rate_puzzle search stats. 9x9 puzzles take 41 bytes, 51 with the index.
+#
+# The reader memory-maps the file, so opening a corpus reads only the
+# header and puzzles are unpacked a chunk at a time as they are used.
+#
+#   python corpus.py generate hard.sdkc -n 100000 -d hard
+#   python corpus.py pack puzzles.txt puzzles.sdkc
+#   python batch_solve.py hard.sdkc -e dlx -j 8
+
+MAGIC = b"SDKC"
+VERSION = 1
+# magic, version, board size, flags, puzzle count, reserved
+HEADER = struct.Struct("<4sHBBQ16x")
+FLAG_INDEX = 1
+SUFFIX = ".sdkc"
+
+# Index difficulty codes are positions in LEVELS, NO_DIFFICULTY when unknown
+DIFFICULTIES = list(LEVELS)
+NO_DIFFICULTY = 255
+INDEX_FIELDS = [("difficulty", "u1"), ("nodes", "<u4"), ("guesses", "<u4"), ("max_depth", "u1")]
+
+
+def packed_size(size):
+    return (size * size + 1) // 2
+
+
+def record_dtype(size, index=False):
+    fields = [("cells", "u1", packed_size(size))]
+    if index:
+        fields += INDEX_FIELDS
+    return np.dtype(fields)
+
+
+def pack(grid):
+    """Pack a grid (Board or list of lists) into 4 bits per cell"""
+    cells = [v for row in grid for v in row]
+    if len(cells) % 2:
+        cells.append(0)
+    return bytes((cells[i] << 4) | cells[i + 1] for i in range(0, len(cells), 2))
+
+
+def unpack(packed, size):
+    """(n, packed_size) uint8 records -> (n, size, size) uint8 grids"""
+    packed = np.asarray(packed, dtype=np.uint8).reshape(len(packed), packed_size(size))
+    cells = np.empty((len(packed), packed_size(size) * 2), dtype=np.uint8)
+    cells[:, 0::2] = packed >> 4
+    cells[:, 1::2] = packed & 0x0F
+    return cells[:, :size * size].reshape(-1, size, size)
+
+
+class CorpusWriter:
+    """Stream puzzles into a packed corpus file
+
+    The puzzle count is written into the header on close, so any number of
+    puzzles can be written without holding them in memory.
+    """
+
+    def __init__(self, path, size=9, index=False):
+        if size > 15:
+            raise ValueError("4 bits per cell only holds boards up to 15x15")
+        self.size = size
+        self.index = index
+        self.count = 0
+        self.file = open(path, "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION, size, FLAG_INDEX if index else 0, 0))
+
+    def write(self, grid, difficulty=None, stats=None):
+        if len(grid) != self.size:
+            raise ValueError(f"expected a {self.size}x{self.size} grid, got {len(grid)} rows")
+        record = pack(grid)
+        if self.index:
+            code = DIFFICULTIES.index(difficulty) if difficulty is not None else NO_DIFFICULTY
+            stats = stats or {}
+            record += struct.pack("<BIIB", code, stats.get("nodes", 0), stats.get("guesses", 0),
+                                  min(stats.get("max_depth", 0), 255))
+        self.file.write(record)
+        self.count += 1
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, VERSION, self.size, FLAG_INDEX if self.index else 0, self.count))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CorpusReader:
+    """Memory-mapped random access to a packed corpus
+
+    records is a NumPy structured array over the mapped file (no copy):
+    records["cells"] holds the packed puzzles and, when the corpus has an
+    index, records["difficulty"], ["nodes"], ["guesses"] and ["max_depth"]
+    the index columns.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            header = f.read(HEADER.size)
+            if len(header) < HEADER.size:
+                raise ValueError(f"{path} is not a puzzle corpus")
+            magic, version, size, flags, count = HEADER.unpack(header)
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a puzzle corpus")
+            if version != VERSION:
+                raise ValueError(f"{path} has corpus version {version}, expected {VERSION}")
+            self.size = size
+            self.has_index = bool(flags & FLAG_INDEX)
+            self.dtype = record_dtype(size, self.has_index)
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if count else None
+        self.records = np.frombuffer(self.map, dtype=self.dtype, count=count, offset=HEADER.size) \
+            if count else np.empty(0, dtype=self.dtype)
+
+    def __len__(self):
+        return len(self.records)
+
+    def packed(self, i):
+        """The packed bytes of puzzle i, a view into the mapped file"""
+        return self.records["cells"][i]
+
+    def grids(self, start=0, stop=None):
+        """Puzzles start..stop as a (n, size, size) uint8 array"""
+        return unpack(self.records["cells"][start:stop], self.size)
+
+    def take(self, indices):
+        """The puzzles at indices as a (n, size, size) uint8 array"""
+        return unpack(self.records["cells"][indices], self.size)
+
+    def __getitem__(self, i):
+        i = range(len(self))[i]
+        return Board(self.size, self.grids(i, i + 1)[0].tobytes())
+
+    def __iter__(self):
+        return self.iter_boards()
+
+    def iter_boards(self, chunk_size=4096):
+        """Every puzzle as a Board, unpacking chunk_size puzzles at a time"""
+        for start in range(0, len(self), chunk_size):
+            for grid in self.grids(start, start + chunk_size):
+                yield Board(self.size, grid.tobytes())
+
+    def iter_lines(self, chunk_size=4096):
+        """Puzzles as digit strings like the batch_solve input lines"""
+        if self.size > 9:
+            raise ValueError("only boards up to 9x9 have one digit per cell")
+        for start in range(0, len(self), chunk_size):
+            grids = self.grids(start, start + chunk_size).reshape(-1, self.size * self.size)
+            text = (grids + ord("0")).tobytes().decode()
+            width = self.size * self.size
+            for i in range(0, len(text), width):
+                yield text[i:i + width]
+
+    def select(self, difficulty):
+        """Indices of the puzzles indexed with the given difficulty"""
+        if not self.has_index:
+            raise ValueError("the corpus has no difficulty index")
+        return np.flatnonzero(self.records["difficulty"] == DIFFICULTIES.index(difficulty))
+
+    def close(self):
+        self.records = np.empty(0, dtype=self.dtype)
+        if self.map is not None:
+            try:
+                self.map.close()
+            except BufferError:
+                pass  # views handed out still use the mapping, it goes with them
+            self.map = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def generate(path, count, difficulty="medium", unique=False, rate=False, seed=None, log=None):
+    """Stream count generated puzzles into a corpus at path
+
+    difficulty sets the clue count. With unique the puzzles have one
+    solution (generate_unique_puzzle) and are rated; rate rates plain
+    make_puzzle output too. Rated corpora get an index with the difficulty
+    rate_puzzle measured, which can differ from the one asked for, and the
+    rating's search stats. A seed makes the corpus reproducible; the
+    random module's state is put back when generate returns.
+    """
+    state = random.getstate()
+    if seed is not None:
+        random.seed(seed)
+    index = unique or rate
+    # plain puzzles are cut from solution grids made in bulk
+    grids = None if unique else iter_full_grids(count, seed=seed)
+    try:
+        with CorpusWriter(path, index=index) as writer:
+            for i in range(count):
+                if unique:
+                    puzzle, _, (rated, stats) = generate_unique_puzzle(difficulty)
+                else:
+                    puzzle = make_puzzle(next(grids), difficulty)
+                    rated, stats = rate_puzzle(puzzle) if rate else (None, None)
+                writer.write(puzzle, rated, stats)
+                if log and (i + 1) % 10000 == 0:
+                    log(f"{i + 1} puzzles written")
+    finally:
+        if seed is not None:
+            random.setstate(state)
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create and read packed puzzle corpora")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    gen = commands.add_parser("generate", help="generate puzzles into a corpus")
+    gen.add_argument("output")
+    gen.add_argument("-n", "--count", type=int, default=1000)
+    gen.add_argument("-d", "--difficulty", choices=DIFFICULTIES, default="medium")
+    gen.add_argument("--unique", action="store_true", help="only puzzles with one solution (slower)")
+    gen.add_argument("--rate", action="store_true", help="store the difficulty and search stats index")
+    gen.add_argument("--seed", type=int)
+
+    pk = commands.add_parser("pack", help="pack an 81 character per line puzzle file")
+    pk.add_argument("input", help="puzzle file (- for stdin)")
+    pk.add_argument("output")
+
+    up = commands.add_parser("unpack", help="write a corpus back out as one puzzle per line")
+    up.add_argument("input")
+    up.add_argument("-o", "--output", default="-", help="output file (default: stdout)")
+
+    info = commands.add_parser("info", help="show a corpus header and index summary")
+    info.add_argument("input")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "generate":
+        generate(args.output, args.count, args.difficulty, args.unique, args.rate, args.seed,
+                 log=lambda msg: print(msg, file=sys.stderr))
+    elif args.command == "pack":
+        from batch_solve import parse_line
+        infile = sys.stdin if args.input == "-" else open(args.input)
+        skipped = 0
+        try:
+            with CorpusWriter(args.output) as writer:
+                for line in infile:
+                    grid = parse_line(line)
+                    if grid is None:
+                        skipped += line.strip() != ""
+                        continue
+                    writer.write(grid)
+        finally:
+            if infile is not sys.stdin:
+                infile.close()
+        print(f"{writer.count} puzzles packed, {skipped} invalid lines skipped", file=sys.stderr)
+    elif args.command == "unpack":
+        outfile = sys.stdout if args.output == "-" else open(args.output, "w")
+        try:
+            with CorpusReader(args.input) as reader:
+                for line in reader.iter_lines():
+                    outfile.write(line + "\n")
+        finally:
+            if outfile is not sys.stdout:
+                outfile.close()
+    else:
+        with CorpusReader(args.input) as reader:
+            print(f"{len(reader)} puzzles, {reader.size}x{reader.size}, "
+                  f"{reader.dtype.itemsize} bytes each, index: {'yes' if reader.has_index else 'no'}")
+            if reader.has_index and len(reader):
+                for difficulty in DIFFICULTIES:
+                    picked = reader.select(difficulty)
+                    if len(picked):
+                        nodes = reader.records["nodes"][picked]
+                        guesses = reader.records["guesses"][picked]
+                        print(f"  {difficulty:7} {len(picked):9}  mean nodes {nodes.mean():.1f}  "
+                              f"mean guesses {guesses.mean():.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import multiprocessing as mp
+import random
+import time
+
+from board import Board, copy_grid
+from sudoku_core import ENGINES, warm_engines
+from solver_stats import new_stats
+from solver_worker import reset_signals
+
+warm_engines()
+
+# Portfolio solving: every engine races on the same puzzle in its own
+# process, the first answer wins and the other processes are stopped at once.
+# Extra randomized entries solve a copy of the puzzle with its digits
+# relabelled, which gives an engine a different value order to try.
+
+
+def relabel(grid, perm):
+    rows = [[perm[v] if v else 0 for v in row] for row in grid]
+    return Board.from_grid(rows) if isinstance(grid, Board) else rows
+
+
+def race_worker(conn, engine, grid, seed):
+    # Runs in the worker process, sends (solved, time, grid, stats, error)
+    reset_signals()
+    grid = copy_grid(grid)
+    size = len(grid)
+    if seed is not None:
+        digits = list(range(1, size + 1))
+        random.Random(seed).shuffle(digits)
+        perm = dict(zip(range(1, size + 1), digits))
+        grid = relabel(grid, perm)
+    stats = new_stats()
+    start_time = time.perf_counter()
+    try:
+        solved = ENGINES[engine](grid, stats)
+    except Exception as e:
+        conn.send((False, time.perf_counter() - start_time, None, None, str(e)))
+        conn.close()
+        return
+    solve_time = time.perf_counter() - start_time
+    if seed is not None:
+        grid = relabel(grid, {d: v for v, d in perm.items()})
+    conn.send((solved, solve_time, grid, stats, None))
+    conn.close()
+
+
+class PortfolioRace:
+    """Race several engines on one grid, polled without blocking
+
+    entries is a list of (label, engine, seed) where engine is a name from
+    sudoku_core.ENGINES and seed is None or a seed for randomized digit
+    order. The interface matches solver_worker.SolveJob: poll() returns
+    (label, solved, time, grid, stats) for the winner (and for any entry that
+    finished in the same poll), then every other entry is stopped and listed
+    in stopped.
+    """
+
+    def __init__(self, entries, grid):
+        self.methods = [label for label, _, _ in entries]
+        self.pending = list(self.methods)
+        self.stopped = []
+        self.errors = {}
+        self.start_time = time.time()
+        self.workers = {}
+        for label, engine, seed in entries:
+            conn, child_conn = mp.Pipe(duplex=False)
+            process = mp.Process(target=race_worker, args=(child_conn, engine, grid, seed), daemon=True)
+            process.start()
+            child_conn.close()
+            self.workers[label] = (process, conn)
+
+    def elapsed(self):
+        return time.time() - self.start_time
+
+    def done(self):
+        return not self.pending
+
+    def current_method(self):
+        return "Race" if self.pending else None
+
+    def poll(self):
+        results = []
+        for label in list(self.pending):
+            process, conn = self.workers[label]
+            try:
+                if not conn.poll():
+                    if not process.is_alive():
+                        self.errors[label] = "worker exited"
+                        self.pending.remove(label)
+                    continue
+                solved, solve_time, grid, stats, error = conn.recv()
+            except (EOFError, OSError):
+                self.errors[label] = "worker exited"
+                self.pending.remove(label)
+                continue
+            self.pending.remove(label)
+            if error is not None:
+                # an engine that cannot take this puzzle does not win the race
+                self.errors[label] = error
+                continue
+            results.append((label, solved, solve_time, grid, stats))
+
+        if results and self.pending:
+            self.stopped = self.cancel()
+        elif not self.pending:
+            self.close()
+        return results
+
+    def cancel(self):
+        """Stop every worker still running and return their labels"""
+        unfinished = self.pending
+        self.pending = []
+        for label in unfinished:
+            process, _ = self.workers[label]
+            # kill, as in SolveJob.cancel: the worker may not have reset
+            # the signal handlers it inherited yet
+            if process.is_alive():
+                process.kill()
+        self.close()
+        return unfinished
+
+    def close(self):
+        for process, conn in self.workers.values():
+            process.join(timeout=1)
+            conn.close()
+
+
+def solve_portfolio(grid, engines=tuple(ENGINES), randomized=0, timeout=None):
+    """Solve grid in place with whichever engine answers first
+
+    randomized adds that many extra entries per engine with shuffled digit
+    order. Returns (solved, winner, results) where results maps the label of
+    every entry that finished to its time, solved flag and stats; entries
+    that were stopped are not included.
+    """
+    entries = [(engine, engine, None) for engine in engines]
+    for engine in engines:
+        for i in range(randomized):
+            entries.append((f"{engine}#{i + 1}", engine, random.randrange(2 ** 32)))
+
+    race = PortfolioRace(entries, grid)
+    results = {}
+    winner = None
+    try:
+        while not race.done():
+            if timeout is not None and race.elapsed() > timeout:
+                race.cancel()
+                break
+            finished = race.poll()
+            for label, solved, solve_time, _, stats in finished:
+                results[label] = {"time": solve_time, "solved": solved, "stats": stats}
+            if finished and winner is None:
+                # entries that arrived in the same poll are ranked by their own timing
+                winner, solved, _, solution, _ = min(finished, key=lambda result: result[2])
+                if solved:
+                    grid[:] = solution
+            time.sleep(0.0005)
+    finally:
+        if not race.done():
+            race.cancel()
+
+    solved = winner is not None and results[winner]["solved"]
+    return solved, winner, results
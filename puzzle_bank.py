@@ -0,0 +1,117 @@
+import json
+import os
+import threading
+
+from sudoko import LEVELS, generate_full_grid, make_puzzle
+
+BANK_DIR = os.path.dirname(os.path.abspath(__file__))
+BANK_FILE = os.path.join(BANK_DIR, "puzzle_bank.json")
+
+
+def bank_file(box_size):
+    # 9x9 keeps the original file name, larger boards get their own file
+    if box_size == 3:
+        return BANK_FILE
+    size = box_size * box_size
+    return os.path.join(BANK_DIR, f"puzzle_bank_{size}x{size}.json")
+
+
+class PuzzleBank:
+    """Pre-generated (solution, puzzle) pairs for every difficulty
+
+    A background thread tops every bank back up to capacity as soon as one
+    drops below low_water, so pop() only takes an item off a list. The banks
+    are saved to path on close() and after every refill, and loaded again
+    on the next start.
+    """
+
+    def __init__(self, path=None, capacity=20, low_water=5, difficulties=tuple(LEVELS), box_size=3):
+        self.box_size = box_size
+        self.path = path or bank_file(box_size)
+        self.capacity = capacity
+        self.low_water = low_water
+        self.banks = {diff: [] for diff in difficulties}
+        self.lock = threading.Condition()
+        self.stopped = False
+        self.filling = False
+        self.worker = None
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        for diff, items in saved.items():
+            if diff in self.banks:
+                self.banks[diff] = [(solution, puzzle) for solution, puzzle in items][:self.capacity]
+
+    def save(self):
+        with self.lock:
+            data = {diff: list(items) for diff, items in self.banks.items()}
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Could not save puzzle bank: {e}")
+
+    def start(self):
+        self.worker = threading.Thread(target=self.refill_loop, daemon=True)
+        self.worker.start()
+
+    def close(self):
+        with self.lock:
+            self.stopped = True
+            self.lock.notify_all()
+        if self.worker is not None:
+            self.worker.join()
+        self.save()
+
+    def pop(self, difficulty):
+        """Return a (solution, puzzle) pair, generating one on the spot if the bank is empty"""
+        with self.lock:
+            bank = self.banks[difficulty]
+            item = bank.pop() if bank else None
+            if len(bank) < self.low_water:
+                self.lock.notify_all()
+        if item is None:
+            item = self.generate(difficulty)
+        return item
+
+    def generate(self, difficulty):
+        solution = generate_full_grid(self.box_size)
+        return solution, make_puzzle(solution, difficulty=difficulty)
+
+    def next_to_fill(self):
+        # Once any bank falls below the low-water mark, keep filling the
+        # emptiest one until they are all back at capacity
+        if any(len(bank) < self.low_water for bank in self.banks.values()):
+            self.filling = True
+        if not self.filling:
+            return None
+        diff = min(self.banks, key=lambda d: len(self.banks[d]))
+        if len(self.banks[diff]) >= self.capacity:
+            self.filling = False
+            return None
+        return diff
+
+    def refill_loop(self):
+        while True:
+            with self.lock:
+                diff = self.next_to_fill()
+                while diff is None and not self.stopped:
+                    self.lock.wait()
+                    diff = self.next_to_fill()
+                if self.stopped:
+                    return
+
+            item = self.generate(diff)
+
+            with self.lock:
+                self.banks[diff].append(item)
+                full = all(len(bank) >= self.capacity for bank in self.banks.values())
+            if full:
+                self.save()
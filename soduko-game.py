@@ -1,10 +1,11 @@
 import pygame
 import sys
-import time
-import numpy as np
-from sudoko import generate_full_grid, make_puzzle
-from sudokuDFS import solve_sudoku as solve_dfs
-from CSP import SudokoCSP
+import math
+from board import Board
+from puzzle_bank import PuzzleBank
+from solver_stats import format_stats
+from portfolio import PortfolioRace
+from solver_worker import ENGINE_NAMES, SolveJob
 
 # Initialize Pygame
 pygame.init()
@@ -13,10 +14,11 @@ pygame.init()
 WIDTH = 900
 HEIGHT = 700
 GRID_SIZE = 540
-CELL_SIZE = GRID_SIZE // 9
+CELL_SIZE = GRID_SIZE // 9  # for the default 9x9 board
 SIDEBAR_WIDTH = WIDTH - GRID_SIZE
 BUTTON_HEIGHT = 50
 PADDING = 20
+SOLVE_TIME_BUDGET = 30  # seconds a method may run before it is stopped
 
 # Colors
 WHITE = (255, 255, 255)
@@ -31,6 +33,7 @@ RED = (231, 76, 60)
 ORANGE = (230, 126, 34)
 PURPLE = (155, 89, 182)
 YELLOW = (241, 196, 15)
+TEAL = (26, 188, 156)
 
 # Fonts
 FONT_LARGE = pygame.font.Font(None, 48)
@@ -40,134 +43,230 @@ FONT_TINY = pygame.font.Font(None, 20)
 
 
 class SudokuGame:
-    def __init__(self):
+    def __init__(self, time_budget=SOLVE_TIME_BUDGET, box_size=3):
         self.screen = pygame.display.set_mode((WIDTH, HEIGHT))
-        pygame.display.set_caption("Sudoku Solver - DFS vs CSP Comparison")
+        pygame.display.set_caption("Sudoku Solver - DFS vs CSP vs DLX Comparison")
         self.clock = pygame.time.Clock()
         
+        # Board is board_size x board_size with box_size x box_size boxes
+        self.box_size = box_size
+        self.board_size = box_size * box_size
+        self.cell_size = GRID_SIZE // self.board_size
+        if self.board_size == 9:
+            self.cell_font = FONT_MEDIUM
+        else:
+            self.cell_font = pygame.font.Font(None, max(14, self.cell_size * 2 // 3))
+        
         self.difficulty = "medium"
         self.original_grid = None
         self.current_grid = None
         self.solution_grid = None
         
         self.solving_results = {
-            "DFS": {"time": 0, "solved": False},
-            "CSP": {"time": 0, "solved": False}
+            "DFS": {"time": 0, "solved": False, "stats": None},
+            "CSP": {"time": 0, "solved": False, "stats": None},
+            "DLX": {"time": 0, "solved": False, "stats": None}
         }
         
         self.show_dashboard = False
         self.game_active = True
         
+        # Rendering caches: text surfaces, the puzzle's static board layer
+        # and the dashboard overlay. Frames are only redrawn when needed
+        self.glyphs = {}
+        self.board_layer = None
+        self.overlay = pygame.Surface((WIDTH, HEIGHT))
+        self.overlay.set_alpha(230)
+        self.overlay.fill(WHITE)
+        self.needs_redraw = True
+        self.status_pos = None
+        
+        # Solving runs in a worker process so the window stays responsive
+        self.time_budget = time_budget
+        self.solve_job = None
+        self.dashboard_when_done = False
+        
+        # Puzzles are generated ahead of time by a background thread
+        self.puzzle_bank = PuzzleBank(box_size=box_size)
+        self.puzzle_bank.start()
+        
         self.generate_new_puzzle()
     
     def generate_new_puzzle(self):
-        """Generate a new Sudoku puzzle"""
-        self.solution_grid = generate_full_grid()
-        self.original_grid = make_puzzle(self.solution_grid, difficulty=self.difficulty)
-        self.current_grid = [row[:] for row in self.original_grid]
+        """Take a new Sudoku puzzle from the puzzle bank"""
+        solution, puzzle = self.puzzle_bank.pop(self.difficulty)
+        self.solution_grid = Board.from_grid(solution)
+        self.original_grid = Board.from_grid(puzzle)
+        self.current_grid = self.original_grid.copy()
+        self.board_layer = None
+        self.needs_redraw = True
         self.show_dashboard = False
         self.solving_results = {
-            "DFS": {"time": 0, "solved": False},
-            "CSP": {"time": 0, "solved": False}
+            "DFS": {"time": 0, "solved": False, "stats": None},
+            "CSP": {"time": 0, "solved": False, "stats": None},
+            "DLX": {"time": 0, "solved": False, "stats": None}
         }
     
+    def start_solve(self, methods, show_dashboard=False, race=False):
+        """Start solving in a worker process, results are picked up by poll_solver
+
+        With race every method gets its own process and the first to finish
+        stops the others.
+        """
+        if self.solve_job is not None:
+            return
+        for method in methods:
+            self.solving_results[method] = {"time": 0, "solved": False, "stats": None}
+        self.current_grid = self.original_grid.copy()
+        self.dashboard_when_done = show_dashboard
+        if race:
+            entries = [(method, ENGINE_NAMES[method], None) for method in methods]
+            self.solve_job = PortfolioRace(entries, self.original_grid)
+        else:
+            self.solve_job = SolveJob(methods, self.original_grid)
+    
+    def poll_solver(self):
+        """Collect finished results and enforce the time budget of every method"""
+        if self.solve_job is None:
+            return
+        
+        for method, solved, solve_time, grid, stats in self.solve_job.poll():
+            self.needs_redraw = True
+            self.solving_results[method]["time"] = solve_time
+            self.solving_results[method]["solved"] = solved
+            self.solving_results[method]["stats"] = stats
+            if solved:
+                self.current_grid = grid
+        
+        # methods run one after another each get the whole budget, the
+        # next one starts when the one running now runs out of it
+        if isinstance(self.solve_job, SolveJob) and not self.solve_job.done():
+            method_time = self.solve_job.method_elapsed()
+            if method_time > self.time_budget:
+                method = self.solve_job.skip()
+                print(f"{method} stopped after the {self.time_budget:.0f}s time budget")
+                self.needs_redraw = True
+                self.solving_results[method]["time"] = method_time
+                self.solving_results[method]["timed_out"] = True
+        
+        if self.solve_job.done():
+            self.needs_redraw = True
+            # methods that lost a race were stopped, not failed
+            for method in getattr(self.solve_job, "stopped", []):
+                self.solving_results[method]["stopped"] = True
+            self.solve_job = None
+            self.show_dashboard = self.dashboard_when_done
+        elif not isinstance(self.solve_job, SolveJob) and self.solve_job.elapsed() > self.time_budget:
+            # a race runs every method at once, so they share the budget
+            print(f"Solving stopped after the {self.time_budget:.0f}s time budget")
+            self.cancel_solve(timed_out=True)
+            self.show_dashboard = self.dashboard_when_done
+    
+    def cancel_solve(self, timed_out=False):
+        """Stop the running solve; methods that were running are marked cancelled
+        (or timed out), the ones that never started as not run"""
+        self.needs_redraw = True
+        elapsed = self.solve_job.elapsed()
+        unfinished = self.solve_job.cancel()
+        # a race runs all its methods at once, a SolveJob only the first
+        running = len(unfinished) if isinstance(self.solve_job, PortfolioRace) else 1
+        for i, method in enumerate(unfinished):
+            result = self.solving_results[method]
+            result["solved"] = False
+            if i < running:
+                result["time"] = elapsed
+                result["timed_out" if timed_out else "cancelled"] = True
+            else:
+                result["not_run"] = True
+        self.solve_job = None
+    
     def solve_with_dfs(self):
         """Solve using DFS backtracking"""
-        grid_copy = [row[:] for row in self.original_grid]
-        start_time = time.time()
-        solved = solve_dfs(grid_copy)
-        end_time = time.time()
-        
-        self.solving_results["DFS"]["time"] = end_time - start_time
-        self.solving_results["DFS"]["solved"] = solved
-        
-        if solved:
-            self.current_grid = grid_copy
-        
-        return solved
+        self.start_solve(["DFS"])
     
     def solve_with_csp(self):
         """Solve using CSP with AC3"""
-        grid_copy = [row[:] for row in self.original_grid]
-        grid_np = np.array(grid_copy)
-        
-        start_time = time.time()
-        csp_solver = SudokoCSP(grid_np)
-        solved = csp_solver.solve()
-        end_time = time.time()
-        
-        self.solving_results["CSP"]["time"] = end_time - start_time
-        self.solving_results["CSP"]["solved"] = solved
-        
-        if solved:
-            self.current_grid = csp_solver.grid.tolist()
-        
-        return solved
+        self.start_solve(["CSP"])
+    
+    def solve_with_dlx(self):
+        """Solve using exact cover with Dancing Links"""
+        self.start_solve(["DLX"])
     
     def solve_all_methods(self):
-        """Solve using both methods and show dashboard"""
-        # Solve with DFS
-        self.current_grid = [row[:] for row in self.original_grid]
-        try:
-            self.solve_with_dfs()
-        except Exception as e:
-            print(f"Error solving with DFS: {e}")
-            self.solving_results["DFS"]["solved"] = False
-        
-        # Solve with CSP
-        self.current_grid = [row[:] for row in self.original_grid]
-        try:
-            self.solve_with_csp()
-        except Exception as e:
-            print(f"Error solving with CSP: {e}")
-            self.solving_results["CSP"]["solved"] = False
-        
-        self.show_dashboard = True
+        """Solve using all methods and show dashboard"""
+        self.start_solve(["DFS", "CSP", "DLX"], show_dashboard=True)
     
-    def draw_grid(self):
-        """Draw the Sudoku grid"""
+    def race_all_methods(self):
+        """Race all methods in parallel, the first to finish wins"""
+        self.start_solve(["DFS", "CSP", "DLX"], show_dashboard=True, race=True)
+    
+    def render_text(self, font, text, color):
+        """Render text through the glyph cache"""
+        key = (font, text, color)
+        surface = self.glyphs.get(key)
+        if surface is None:
+            surface = self.glyphs[key] = font.render(text, True, color)
+        return surface
+    
+    def build_board_layer(self):
+        """Pre-render the cells, grid lines and given digits of the current puzzle"""
+        cell_size = self.cell_size
+        grid_end = cell_size * self.board_size + PADDING
+        layer = pygame.Surface((grid_end + 2, grid_end + 2))
+        layer.fill(WHITE)
+        
         # Draw cells
-        for row in range(9):
-            for col in range(9):
-                x = col * CELL_SIZE + PADDING
-                y = row * CELL_SIZE + PADDING
+        for row in range(self.board_size):
+            for col in range(self.board_size):
+                x = col * cell_size + PADDING
+                y = row * cell_size + PADDING
                 
                 # Draw cell background
                 if self.original_grid[row][col] != 0:
-                    pygame.draw.rect(self.screen, LIGHT_GRAY, (x, y, CELL_SIZE, CELL_SIZE))
+                    pygame.draw.rect(layer, LIGHT_GRAY, (x, y, cell_size, cell_size))
                 else:
-                    pygame.draw.rect(self.screen, WHITE, (x, y, CELL_SIZE, CELL_SIZE))
+                    pygame.draw.rect(layer, WHITE, (x, y, cell_size, cell_size))
                 
                 # Draw cell border
-                pygame.draw.rect(self.screen, GRAY, (x, y, CELL_SIZE, CELL_SIZE), 1)
+                pygame.draw.rect(layer, GRAY, (x, y, cell_size, cell_size), 1)
                 
-                # Draw number
-                if self.current_grid[row][col] != 0:
-                    num = str(self.current_grid[row][col])
-                    if self.original_grid[row][col] != 0:
-                        color = BLACK
-                        font = FONT_MEDIUM
-                    else:
-                        color = BLUE
-                        font = FONT_MEDIUM
-                    
-                    text = font.render(num, True, color)
-                    text_rect = text.get_rect(center=(x + CELL_SIZE // 2, y + CELL_SIZE // 2))
-                    self.screen.blit(text, text_rect)
-        
-        # Draw thick lines for 3x3 boxes
-        for i in range(4):
+                # Draw given number
+                if self.original_grid[row][col] != 0:
+                    text = self.render_text(self.cell_font, str(self.original_grid[row][col]), BLACK)
+                    layer.blit(text, text.get_rect(center=(x + cell_size // 2, y + cell_size // 2)))
+        
+        # Draw thick lines for the boxes
+        box_width = self.box_size * cell_size
+        for i in range(self.box_size + 1):
             thickness = 3
             # Vertical lines
-            pygame.draw.line(self.screen, BLACK, 
-                           (i * 3 * CELL_SIZE + PADDING, PADDING), 
-                           (i * 3 * CELL_SIZE + PADDING, GRID_SIZE + PADDING), 
+            pygame.draw.line(layer, BLACK, 
+                           (i * box_width + PADDING, PADDING), 
+                           (i * box_width + PADDING, grid_end), 
                            thickness)
             # Horizontal lines
-            pygame.draw.line(self.screen, BLACK, 
-                           (PADDING, i * 3 * CELL_SIZE + PADDING), 
-                           (GRID_SIZE + PADDING, i * 3 * CELL_SIZE + PADDING), 
+            pygame.draw.line(layer, BLACK, 
+                           (PADDING, i * box_width + PADDING), 
+                           (grid_end, i * box_width + PADDING), 
                            thickness)
+        return layer
+    
+    def draw_grid(self):
+        """Draw the Sudoku grid: the cached board layer plus the filled-in digits"""
+        if self.board_layer is None:
+            self.board_layer = self.build_board_layer()
+        self.screen.blit(self.board_layer, (0, 0))
+        
+        cell_size = self.cell_size
+        for row in range(self.board_size):
+            original = self.original_grid[row]
+            current = self.current_grid[row]
+            for col in range(self.board_size):
+                if current[col] != 0 and original[col] == 0:
+                    x = col * cell_size + PADDING
+                    y = row * cell_size + PADDING
+                    text = self.render_text(self.cell_font, str(current[col]), BLUE)
+                    self.screen.blit(text, text.get_rect(center=(x + cell_size // 2, y + cell_size // 2)))
     
     def draw_button(self, text, x, y, width, height, color, text_color=WHITE):
         """Draw a button and return its rect"""
@@ -175,7 +274,7 @@ class SudokuGame:
         pygame.draw.rect(self.screen, color, rect, border_radius=8)
         pygame.draw.rect(self.screen, DARK_GRAY, rect, 2, border_radius=8)
         
-        text_surface = FONT_SMALL.render(text, True, text_color)
+        text_surface = self.render_text(FONT_SMALL, text, text_color)
         text_rect = text_surface.get_rect(center=rect.center)
         self.screen.blit(text_surface, text_rect)
         
@@ -187,12 +286,12 @@ class SudokuGame:
         y_offset = PADDING
         
         # Title
-        title = FONT_MEDIUM.render("Controls", True, BLACK)
+        title = self.render_text(FONT_MEDIUM, "Controls", BLACK)
         self.screen.blit(title, (sidebar_x, y_offset))
         y_offset += 60
         
         # Difficulty selection
-        diff_text = FONT_SMALL.render("Difficulty:", True, BLACK)
+        diff_text = self.render_text(FONT_SMALL, "Difficulty:", BLACK)
         self.screen.blit(diff_text, (sidebar_x, y_offset))
         y_offset += 35
         
@@ -214,7 +313,7 @@ class SudokuGame:
         y_offset += BUTTON_HEIGHT + 20
         
         # Solve buttons
-        solve_text = FONT_SMALL.render("Solve with:", True, BLACK)
+        solve_text = self.render_text(FONT_SMALL, "Solve with:", BLACK)
         self.screen.blit(solve_text, (sidebar_x, y_offset))
         y_offset += 35
         
@@ -224,23 +323,54 @@ class SudokuGame:
         
         self.solve_csp_button = self.draw_button("CSP (AC-3)", sidebar_x, y_offset, 
                                                  SIDEBAR_WIDTH - PADDING * 2, BUTTON_HEIGHT, PURPLE)
+        y_offset += BUTTON_HEIGHT + 10
+        
+        self.solve_dlx_button = self.draw_button("Dancing Links (DLX)", sidebar_x, y_offset, 
+                                                 SIDEBAR_WIDTH - PADDING * 2, BUTTON_HEIGHT, TEAL)
         y_offset += BUTTON_HEIGHT + 20
         
         # Compare all button
-        self.compare_all_button = self.draw_button("Compare Both Methods", sidebar_x, y_offset, 
+        self.compare_all_button = self.draw_button("Compare All Methods", sidebar_x, y_offset, 
                                                    SIDEBAR_WIDTH - PADDING * 2, BUTTON_HEIGHT, GREEN)
+        y_offset += BUTTON_HEIGHT + 10
+        
+        self.race_all_button = self.draw_button("Race All (Fastest Wins)", sidebar_x, y_offset, 
+                                                SIDEBAR_WIDTH - PADDING * 2, BUTTON_HEIGHT, BLUE)
+        y_offset += BUTTON_HEIGHT + 20
+        
+        self.status_pos = (sidebar_x, y_offset)
+        if self.solve_job is not None:
+            self.draw_solver_status(sidebar_x, y_offset)
+    
+    def draw_solver_status(self, x, y):
+        """Draw a spinner, the elapsed time and a Cancel button while solving, return the area drawn"""
+        elapsed = self.solve_job.elapsed()
+        area = pygame.Rect(x, y, SIDEBAR_WIDTH - PADDING * 2, 40)
+        self.screen.fill(WHITE, area)
+        
+        # Spinner: a quarter arc turning once per second
+        center = (x + 20, y + 20)
+        pygame.draw.circle(self.screen, LIGHT_GRAY, center, 16, 4)
+        angle = -elapsed * 2 * math.pi
+        arc_rect = pygame.Rect(center[0] - 16, center[1] - 16, 32, 32)
+        pygame.draw.arc(self.screen, BLUE, arc_rect, angle, angle + math.pi / 2, 4)
+        
+        method = self.solve_job.current_method() or ""
+        status = FONT_SMALL.render(f"{method} {elapsed:.1f}s", True, BLACK)
+        self.screen.blit(status, (x + 50, y + 12))
+        
+        self.cancel_solve_button = self.draw_button("Cancel", x + SIDEBAR_WIDTH - PADDING * 2 - 120, y, 
+                                                    120, 40, RED)
+        return area
     
     def draw_dashboard(self):
         """Draw the comparison dashboard"""
         # Semi-transparent overlay
-        overlay = pygame.Surface((WIDTH, HEIGHT))
-        overlay.set_alpha(230)
-        overlay.fill(WHITE)
-        self.screen.blit(overlay, (0, 0))
+        self.screen.blit(self.overlay, (0, 0))
         
         # Dashboard container
         dash_width = 700
-        dash_height = 450
+        dash_height = 560
         dash_x = (WIDTH - dash_width) // 2
         dash_y = (HEIGHT - dash_height) // 2
         
@@ -248,14 +378,14 @@ class SudokuGame:
         pygame.draw.rect(self.screen, BLUE, (dash_x, dash_y, dash_width, dash_height), 3, border_radius=15)
         
         # Title
-        title = FONT_LARGE.render("Algorithm Comparison", True, BLUE)
+        title = self.render_text(FONT_LARGE, "Algorithm Comparison", BLUE)
         title_rect = title.get_rect(center=(WIDTH // 2, dash_y + 40))
         self.screen.blit(title, title_rect)
         
         # Results
-        y_offset = dash_y + 110
-        methods = ["DFS", "CSP"]
-        colors = [ORANGE, PURPLE]
+        y_offset = dash_y + 100
+        methods = ["DFS", "CSP", "DLX"]
+        colors = [ORANGE, PURPLE, TEAL]
         
         # Find fastest method
         fastest_time = float('inf')
@@ -271,10 +401,12 @@ class SudokuGame:
             # Method name with full description
             if method == "DFS":
                 display_name = "DFS Backtracking"
-            else:
+            elif method == "CSP":
                 display_name = "CSP (AC-3)"
+            else:
+                display_name = "Dancing Links (DLX)"
                 
-            method_text = FONT_MEDIUM.render(display_name, True, color)
+            method_text = self.render_text(FONT_MEDIUM, display_name, color)
             self.screen.blit(method_text, (dash_x + 50, y_offset))
             
             # Status and time
@@ -285,14 +417,30 @@ class SudokuGame:
                 
                 # Mark fastest
                 if method == fastest_method:
-                    trophy = FONT_MEDIUM.render("🏆", True, YELLOW)
+                    trophy = self.render_text(FONT_MEDIUM, "🏆", YELLOW)
                     self.screen.blit(trophy, (dash_x + 320, y_offset))
+            elif result.get("stopped"):
+                status = "– Stopped"
+                status_color = DARK_GRAY
+                time_text = "lost race"
+            elif result.get("timed_out"):
+                status = "✗ Timed out"
+                status_color = RED
+                time_text = f"{result['time']:.1f}s"
+            elif result.get("cancelled"):
+                status = "– Cancelled"
+                status_color = DARK_GRAY
+                time_text = f"{result['time']:.1f}s"
+            elif result.get("not_run"):
+                status = "– Not run"
+                status_color = DARK_GRAY
+                time_text = "N/A"
             else:
                 status = "✗ Failed"
                 status_color = RED
                 time_text = "N/A"
             
-            status_surface = FONT_SMALL.render(status, True, status_color)
+            status_surface = self.render_text(FONT_SMALL, status, status_color)
             self.screen.blit(status_surface, (dash_x + 380, y_offset + 5))
             
             time_surface = FONT_SMALL.render(time_text, True, BLACK)
@@ -318,7 +466,12 @@ class SudokuGame:
                 # Border
                 pygame.draw.rect(self.screen, DARK_GRAY, (bar_x, bar_y, bar_width, bar_height), 2, border_radius=5)
             
-            y_offset += 120
+            # Search counters
+            if result["stats"]:
+                stats_surface = FONT_TINY.render(format_stats(result["stats"]), True, DARK_GRAY)
+                self.screen.blit(stats_surface, (dash_x + 50, y_offset + 78))
+            
+            y_offset += 110
         
         # Close button
         self.close_dashboard_button = self.draw_button("Close & Play Again", 
@@ -333,6 +486,12 @@ class SudokuGame:
                 self.generate_new_puzzle()
             return
         
+        # While solving, only the Cancel button works
+        if self.solve_job is not None:
+            if hasattr(self, 'cancel_solve_button') and self.cancel_solve_button.collidepoint(pos):
+                self.cancel_solve()
+            return
+        
         # Difficulty buttons
         for diff, rect in self.difficulty_buttons.items():
             if rect.collidepoint(pos):
@@ -354,37 +513,60 @@ class SudokuGame:
             self.solve_with_csp()
             return
         
+        if self.solve_dlx_button.collidepoint(pos):
+            self.solve_with_dlx()
+            return
+        
         if self.compare_all_button.collidepoint(pos):
             self.solve_all_methods()
             return
+        
+        if self.race_all_button.collidepoint(pos):
+            self.race_all_methods()
+            return
     
     def run(self):
         """Main game loop"""
         running = True
         while running:
-            self.screen.fill(WHITE)
-            
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
                     running = False
                 elif event.type == pygame.MOUSEBUTTONDOWN:
                     if event.button == 1:  # Left click
                         self.handle_click(event.pos)
+                        self.needs_redraw = True
+                elif event.type in (pygame.WINDOWEXPOSED, pygame.VIDEOEXPOSE):
+                    self.needs_redraw = True
             
-            if not self.show_dashboard:
-                self.draw_grid()
-                self.draw_sidebar()
-            else:
+            self.poll_solver()
+            
+            # Full repaints only happen after something changed, while
+            # solving only the status area is redrawn and idle frames draw
+            # nothing at all
+            if self.needs_redraw:
+                self.needs_redraw = False
+                self.screen.fill(WHITE)
                 self.draw_grid()
-                self.draw_dashboard()
+                if self.show_dashboard:
+                    self.draw_dashboard()
+                else:
+                    self.draw_sidebar()
+                pygame.display.flip()
+            elif self.solve_job is not None and not self.show_dashboard:
+                pygame.display.update(self.draw_solver_status(*self.status_pos))
             
-            pygame.display.flip()
             self.clock.tick(60)
         
+        if self.solve_job is not None:
+            self.solve_job.cancel()
+        self.puzzle_bank.close()
         pygame.quit()
         sys.exit()
 
 
 if __name__ == "__main__":
-    game = SudokuGame()
+    # optional box size argument: 4 plays 16x16, 5 plays 25x25
+    box_size = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    game = SudokuGame(box_size=box_size)
     game.run()
\ No newline at end of file
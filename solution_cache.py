@@ -0,0 +1,169 @@
+from collections import OrderedDict
+from itertools import permutations, product
+
+from solver_stats import reset_stats
+
+# Solution cache keyed by a symmetry-invariant form of the puzzle.
+#
+# The form is the puzzle after a transform T (optional transposition, band
+# and row order, stack and column order) with digits relabelled 1, 2, ...
+# in order of first appearance. Rows and columns are ordered by invariants
+# of the clue pattern, and orderings that the invariants cannot separate are
+# all tried, keeping the smallest result. Puzzles that are the same under
+# Sudoku symmetries then get the same key. The key is always T applied to
+# the puzzle itself, so two puzzles with the same key really are equivalent;
+# when there are more tied orderings than MAX_ORDERINGS only the first ones
+# are tried, which can cost a cache hit but never gives a wrong solution.
+
+MAX_ORDERINGS = 16  # tied orderings tried for rows, and again for columns
+
+
+def transpose(grid):
+    return [list(col) for col in zip(*grid)]
+
+
+def line_orders(mask):
+    """Candidate orders of the 9 rows of a clue mask, respecting bands"""
+    cols = list(zip(*mask))
+    col_sig = [tuple(sorted(sum(col[b * 3:b * 3 + 3]) for b in range(3))) for col in cols]
+    row_sig = []
+    for row in mask:
+        per_stack = tuple(sorted(sum(row[s * 3:s * 3 + 3]) for s in range(3)))
+        row_sig.append((per_stack, tuple(sorted(col_sig[c] for c in range(9) if row[c]))))
+
+    # rows within each band, grouped by equal signature
+    band_choices = []
+    band_sig = []
+    for band in range(3):
+        rows = sorted(range(band * 3, band * 3 + 3), key=lambda r: row_sig[r])
+        band_sig.append(tuple(row_sig[r] for r in rows))
+        band_choices.append(tied_orders(rows, [row_sig[r] for r in rows]))
+
+    bands = sorted(range(3), key=lambda b: band_sig[b])
+    orders = []
+    for band_order in tied_orders(bands, [band_sig[b] for b in bands]):
+        for rows in product(*(band_choices[b] for b in band_order)):
+            orders.append([r for band_rows in rows for r in band_rows])
+            if len(orders) >= MAX_ORDERINGS:
+                return orders
+    return orders
+
+
+def tied_orders(items, sigs):
+    # all orders of items (already sorted by sigs) that only swap equal sigs
+    groups = []
+    for item, sig in zip(items, sigs):
+        if groups and groups[-1][0] == sig:
+            groups[-1][1].append(item)
+        else:
+            groups.append((sig, [item]))
+    return [[x for part in parts for x in part]
+            for parts in product(*(list(permutations(members)) for _, members in groups))]
+
+
+def canonical_form(grid):
+    """Return (key, transform) for a puzzle
+
+    key is a tuple of 81 relabelled cells, transform is
+    (transposed, row_order, col_order, labels) with labels mapping the
+    puzzle's digits to the key's digits.
+    """
+    best = None
+    for transposed in (False, True):
+        g = transpose(grid) if transposed else grid
+        mask = [[1 if v else 0 for v in row] for row in g]
+        row_orders = line_orders(mask)
+        col_orders = line_orders(transpose(mask))
+        for row_order in row_orders:
+            for col_order in col_orders:
+                labels = {}
+                key = []
+                for r in row_order:
+                    row = g[r]
+                    for c in col_order:
+                        v = row[c]
+                        if v:
+                            label = labels.get(v)
+                            if label is None:
+                                label = labels[v] = len(labels) + 1
+                            key.append(label)
+                        else:
+                            key.append(0)
+                key = tuple(key)
+                if best is None or key < best[0]:
+                    best = (key, (transposed, row_order, col_order, labels))
+    return best
+
+
+def complete_labels(labels):
+    # digits missing from the clues take the unused labels in increasing
+    # order, any such pairing keeps the solution valid
+    labels = dict(labels)
+    missing = [d for d in range(1, 10) if d not in labels]
+    unused = [l for l in range(1, 10) if l not in labels.values()]
+    labels.update(zip(missing, unused))
+    return labels
+
+
+def to_canonical(solution, transform):
+    transposed, row_order, col_order, labels = transform
+    labels = complete_labels(labels)
+    g = transpose(solution) if transposed else solution
+    return tuple(labels[g[r][c]] for r in row_order for c in col_order)
+
+
+def from_canonical(key_solution, transform):
+    transposed, row_order, col_order, labels = transform
+    digits = {l: d for d, l in complete_labels(labels).items()}
+    g = [[0] * 9 for _ in range(9)]
+    for i, r in enumerate(row_order):
+        for j, c in enumerate(col_order):
+            g[r][c] = digits[key_solution[i * 9 + j]]
+    return transpose(g) if transposed else g
+
+
+class SolutionCache:
+    """Bounded LRU cache of solutions keyed by canonical_form"""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def info(self):
+        return {"hits": self.hits, "misses": self.misses,
+                "size": len(self.entries), "maxsize": self.maxsize}
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def solve(self, solver, grid, stats=None):
+        """Fill grid like solver(grid, stats), skipping the search on a cache hit"""
+        key, transform = canonical_form(grid)
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            if stats is not None:
+                reset_stats(stats)
+            key_solution = self.entries[key]
+            if key_solution is None:
+                return False
+            grid[:] = from_canonical(key_solution, transform)
+            return True
+
+        self.misses += 1
+        solved = solver(grid, stats)
+        self.entries[key] = to_canonical(grid, transform) if solved else None
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+        return solved
+
+
+def cached_engine(solver, cache):
+    """Wrap an engine (grid, stats=None) -> bool so it goes through cache"""
+    def solve(grid, stats=None):
+        return cache.solve(solver, grid, stats)
+    return solve
@@ -0,0 +1,325 @@
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from batch_solve import solve_chunk
+from sudoku_core import ENGINES, warm_engines
+
+# Local solve service. Other processes on the same host send puzzles over a
+# TCP or Unix socket and the engines answer from a pool of worker processes
+# that stay warm, so no request pays for interpreter start-up or imports.
+#
+# The protocol is one JSON object per line in each direction:
+#
+#   {"id": 1, "puzzle": "53..7....6..195...", "engine": "dlx", "deadline": 2}
+#   {"id": 2, "puzzles": ["...", "..."]}
+#   {"id": 3, "op": "metrics"}
+#
+# and the answers carry the same id, with "solution" or "solutions" holding
+# the 81 digit solution, "unsolvable" or "invalid" per puzzle (as in
+# batch_solve), or "error" when the request could not be served.
+# Concurrent puzzles are gathered into micro-batches of up to --batch-size
+# per engine. When the queue is full the server stops reading from the
+# client, so the socket pushes back on senders.
+#
+# A deadline only bounds the wait for an answer. Puzzles still queued when
+# it passes are dropped, but a batch already handed to a worker runs to
+# the end, so a pathological puzzle keeps that worker busy past the
+# deadline of every request in its batch.
+#
+#   python solve_server.py --port 8765 -j 4
+#   python solve_server.py --unix /tmp/sudoku.sock
+
+# Longest request line accepted, about 190000 puzzles
+LINE_LIMIT = 16 * 1024 * 1024
+
+
+class SolveServer:
+    """Micro-batching asyncio front end to a warm process pool"""
+
+    def __init__(self, jobs=None, batch_size=64, batch_wait=0.002, max_queue=4096,
+                 deadline=10.0, propagate=False, cache_size=0):
+        self.jobs = jobs or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.max_queue = max_queue
+        self.deadline = deadline
+        self.propagate = propagate
+        self.cache_size = cache_size
+
+        self.pool = None
+        self.queue = None
+        self.slots = None
+        self.server = None
+        self.path = None
+        self.batcher = None
+
+        self.start_time = time.monotonic()
+        self.counters = {
+            "connections": 0,
+            "requests": 0,
+            "puzzles": 0,
+            "completed": 0,
+            "batches": 0,
+            "deadline_exceeded": 0,
+            "errors": 0,
+        }
+        self.in_flight = 0
+        # (time, puzzles) of recent batches for the current throughput
+        self.recent = deque()
+
+    async def start(self, host="127.0.0.1", port=8765, path=None):
+        """Warm the pool and start listening on (host, port), or on a Unix socket at path"""
+        loop = asyncio.get_running_loop()
+        # every pool process imports the engines once, so no batch pays for it
+        self.pool = ProcessPoolExecutor(self.jobs, initializer=warm_engines)
+        # one task per worker makes every process start before the first request
+        await asyncio.gather(*(loop.run_in_executor(self.pool, warm_engines) for _ in range(self.jobs)))
+
+        self.queue = asyncio.Queue(self.max_queue)
+        # at most 2 batches per worker in flight, the rest waits in the queue
+        self.slots = asyncio.Semaphore(self.jobs * 2)
+        self.batcher = asyncio.create_task(self.batch_loop())
+        if path is not None:
+            self.path = path
+            self.server = await asyncio.start_unix_server(self.handle_connection, path, limit=LINE_LIMIT)
+        else:
+            self.server = await asyncio.start_server(self.handle_connection, host, port, limit=LINE_LIMIT)
+        return self.server
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        if self.batcher is not None:
+            self.batcher.cancel()
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+        if self.path is not None and os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def metrics(self):
+        now = time.monotonic()
+        while self.recent and self.recent[0][0] < now - 10:
+            self.recent.popleft()
+        uptime = now - self.start_time
+        metrics = dict(self.counters)
+        metrics.update({
+            "uptime_s": uptime,
+            "queue_depth": self.queue.qsize() if self.queue is not None else 0,
+            "in_flight_batches": self.in_flight,
+            "mean_batch_size": self.counters["completed"] / self.counters["batches"] if self.counters["batches"] else 0.0,
+            "throughput_per_s": self.counters["completed"] / uptime if uptime > 0 else 0.0,
+            "recent_throughput_per_s": sum(n for _, n in self.recent) / min(10, uptime) if uptime > 0 else 0.0,
+        })
+        return metrics
+
+    async def handle_connection(self, reader, writer):
+        self.counters["connections"] += 1
+        replies = set()
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    self.counters["errors"] += 1
+                    self.send(writer, {"id": None, "error": f"request longer than {LINE_LIMIT} bytes"})
+                    break
+                if not line:
+                    break
+                reply = await self.accept(line)
+                if isinstance(reply, dict):
+                    self.send(writer, reply)
+                else:
+                    # answered once the puzzles are solved, later requests
+                    # on the connection are read in the meantime
+                    task = asyncio.create_task(self.answer(writer, *reply))
+                    replies.add(task)
+                    task.add_done_callback(replies.discard)
+            if replies:
+                await asyncio.gather(*replies)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def send(self, writer, reply):
+        writer.write(json.dumps(reply).encode() + b"\n")
+
+    async def accept(self, line):
+        """Queue the puzzles of a request line
+
+        Returns a reply dict right away, or (id, futures, expires, batched)
+        for answer() to wait on.
+        """
+        try:
+            message = json.loads(line)
+            if not isinstance(message, dict):
+                raise ValueError("expected a JSON object")
+        except ValueError as e:
+            self.counters["errors"] += 1
+            return {"id": None, "error": f"bad request: {e}"}
+
+        request_id = message.get("id")
+        if message.get("op") == "metrics":
+            return {"id": request_id, "metrics": self.metrics()}
+
+        engine = message.get("engine", "dfs")
+        if engine not in ENGINES:
+            self.counters["errors"] += 1
+            return {"id": request_id, "error": f"unknown engine {engine!r}, expected one of {sorted(ENGINES)}"}
+        batched = "puzzles" in message
+        puzzles = message["puzzles"] if batched else [message.get("puzzle")]
+        if not isinstance(puzzles, list) or not all(isinstance(p, str) for p in puzzles):
+            self.counters["errors"] += 1
+            return {"id": request_id, "error": "puzzles must be a list of strings" if batched else "puzzle must be a string"}
+        deadline = message.get("deadline", self.deadline)
+        # bool is an int, but not a number of seconds
+        if isinstance(deadline, bool) or not isinstance(deadline, (int, float)) or not deadline > 0:
+            self.counters["errors"] += 1
+            return {"id": request_id, "error": "deadline must be a positive number of seconds"}
+
+        self.counters["requests"] += 1
+        self.counters["puzzles"] += len(puzzles)
+        loop = asyncio.get_running_loop()
+        expires = loop.time() + deadline
+        futures = []
+        for puzzle in puzzles:
+            future = loop.create_future()
+            futures.append(future)
+            # blocks while the queue is full, which stops this connection's reads
+            await self.queue.put((engine, puzzle, future, expires))
+        return request_id, futures, expires, batched
+
+    async def answer(self, writer, request_id, futures, expires, batched):
+        loop = asyncio.get_running_loop()
+        try:
+            results = await asyncio.wait_for(asyncio.gather(*futures), max(0, expires - loop.time()))
+        except asyncio.TimeoutError:
+            self.counters["deadline_exceeded"] += 1
+            reply = {"id": request_id, "error": "deadline exceeded"}
+        except Exception as e:
+            self.counters["errors"] += 1
+            reply = {"id": request_id, "error": f"Error solving: {e}"}
+        else:
+            reply = {"id": request_id, "solutions": results} if batched else {"id": request_id, "solution": results[0]}
+        try:
+            self.send(writer, reply)
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+    async def batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self.queue.get()]
+            # give concurrent requests a moment to join the batch
+            if self.batch_wait and self.queue.qsize() < self.batch_size - 1:
+                await asyncio.sleep(self.batch_wait)
+            while len(items) < self.batch_size and not self.queue.empty():
+                items.append(self.queue.get_nowait())
+
+            by_engine = {}
+            now = loop.time()
+            for engine, puzzle, future, expires in items:
+                # the client stopped waiting (deadline passed or disconnected)
+                if future.done() or now > expires:
+                    continue
+                by_engine.setdefault(engine, []).append((puzzle, future))
+
+            for engine, batch in by_engine.items():
+                await self.slots.acquire()
+                self.in_flight += 1
+                asyncio.create_task(self.run_batch(engine, batch))
+
+    async def run_batch(self, engine, batch):
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(self.pool, solve_chunk, engine, [p for p, _ in batch],
+                                                 self.propagate, self.cache_size)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+            self.counters["batches"] += 1
+            self.counters["completed"] += len(batch)
+            self.recent.append((time.monotonic(), len(batch)))
+        finally:
+            self.in_flight -= 1
+            self.slots.release()
+
+
+def call(message, address=("127.0.0.1", 8765), timeout=None):
+    """Send one request to a running server and return its reply
+
+    address is (host, port) or the path of a Unix socket.
+    """
+    family = socket.AF_UNIX if isinstance(address, str) else socket.AF_INET
+    with socket.socket(family, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(address)
+        with sock.makefile("rwb") as f:
+            f.write(json.dumps(message).encode() + b"\n")
+            f.flush()
+            return json.loads(f.readline())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the Sudoku engines on a local socket")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", metavar="PATH", help="listen on a Unix socket instead of TCP")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="worker processes (default: number of cores)")
+    parser.add_argument("--batch-size", type=int, default=64, help="most puzzles in one batch")
+    parser.add_argument("--batch-wait", type=float, default=2.0, metavar="MS",
+                        help="time a batch waits for more puzzles (default: 2ms)")
+    parser.add_argument("--max-queue", type=int, default=4096,
+                        help="queued puzzles before clients are pushed back")
+    parser.add_argument("--deadline", type=float, default=10.0,
+                        help="seconds a request may take unless it sets its own")
+    parser.add_argument("--propagate", action="store_true",
+                        help="run vectorized singles propagation on each batch before searching")
+    parser.add_argument("--cache", type=int, default=0, metavar="SIZE",
+                        help="solutions kept per worker in a symmetry-aware LRU cache (default: off)")
+    args = parser.parse_args(argv)
+
+    server = SolveServer(args.jobs, args.batch_size, args.batch_wait / 1000, args.max_queue,
+                         args.deadline, args.propagate, args.cache)
+
+    async def serve():
+        listener = await server.start(args.host, args.port, args.unix)
+        where = args.unix or f"{args.host}:{args.port}"
+        print(f"Serving {server.jobs} workers on {where}", file=sys.stderr)
+
+        # stop cleanly on Ctrl-C or kill so the pool processes exit too
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, asyncio.current_task().cancel)
+            except NotImplementedError:
+                pass  # Windows
+        try:
+            await listener.serve_forever()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            await server.close()
+
+    asyncio.run(serve())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+# Counters filled in by the engines when they are given a stats dict:
+#   nodes           search nodes expanded
+#   backtracks      tentative assignments undone
+#   revise_calls    AC-3 revise calls (CSP only)
+#   pruned          domain values removed by propagation (CSP only)
+#   max_depth       deepest recursion level reached
+#   propagation_ns  time spent in constraint propagation
+#   search_ns       time spent searching, propagation excluded
+
+STAT_KEYS = ("nodes", "backtracks", "revise_calls", "pruned", "max_depth",
+             "propagation_ns", "search_ns")
+
+
+def reset_stats(stats):
+    for key in STAT_KEYS:
+        stats[key] = 0
+    return stats
+
+
+def new_stats():
+    return reset_stats({})
+
+
+def format_stats(stats):
+    """One line summary of the counters for the dashboard"""
+    return (f"nodes {stats['nodes']}  backtracks {stats['backtracks']}  "
+            f"revise {stats['revise_calls']}  pruned {stats['pruned']}  "
+            f"depth {stats['max_depth']}  "
+            f"prop {stats['propagation_ns'] / 1e6:.2f}ms  search {stats['search_ns'] / 1e6:.2f}ms")
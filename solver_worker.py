@@ -0,0 +1,124 @@
+import multiprocessing as mp
+import signal
+import time
+
+from board import copy_grid
+from sudoku_core import ENGINES, warm_engines
+from solver_stats import new_stats
+
+warm_engines()
+
+# Dashboard method names -> batch_solve engine names
+ENGINE_NAMES = {
+    "DFS": "dfs",
+    "CSP": "csp",
+    "DLX": "dlx",
+}
+
+
+def reset_signals():
+    # pygame.init() lets SDL catch SIGINT and SIGTERM, and forked workers
+    # inherit that: terminate() or Ctrl-C would only queue a quit event
+    # nobody reads. Workers call this first so the signals stop them again
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+
+def solve_methods(conn, methods, grid):
+    # Runs in the worker process, sends (method, solved, time, grid, stats) per method
+    reset_signals()
+    for method in methods:
+        grid_copy = copy_grid(grid)
+        stats = new_stats()
+        start_time = time.perf_counter()
+        try:
+            solved = ENGINES[ENGINE_NAMES[method]](grid_copy, stats)
+        except Exception as e:
+            print(f"Error solving with {method}: {e}")
+            solved = False
+        end_time = time.perf_counter()
+        conn.send((method, solved, end_time - start_time, grid_copy, stats))
+    conn.close()
+
+
+class SolveJob:
+    """Solve a grid with one or more methods in a separate process
+
+    The caller polls for results every frame instead of blocking, and can
+    stop the worker at any time with cancel(), or give up on just the
+    method running now with skip().
+    """
+
+    def __init__(self, methods, grid):
+        self.methods = list(methods)
+        self.pending = list(methods)
+        self.grid = grid
+        self.start_time = time.time()
+        self.start_worker()
+
+    def start_worker(self):
+        # solves the pending methods in order; method_start is when the
+        # first of them started
+        self.method_start = time.time()
+        self.conn, child_conn = mp.Pipe(duplex=False)
+        self.process = mp.Process(target=solve_methods, args=(child_conn, list(self.pending), self.grid), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def elapsed(self):
+        return time.time() - self.start_time
+
+    def method_elapsed(self):
+        """Time the method running now has taken so far"""
+        return time.time() - self.method_start
+
+    def done(self):
+        return not self.pending
+
+    def current_method(self):
+        return self.pending[0] if self.pending else None
+
+    def poll(self):
+        """Return the (method, solved, time, grid, stats) results that arrived since the last poll"""
+        results = []
+        try:
+            while self.pending and self.conn.poll():
+                result = self.conn.recv()
+                self.pending.remove(result[0])
+                results.append(result)
+                self.method_start = time.time()
+        except (EOFError, OSError):
+            # the worker died without sending everything
+            self.cancel()
+            return results
+
+        if self.done():
+            self.close()
+        elif not self.process.is_alive() and not self.conn.poll():
+            self.cancel()
+        return results
+
+    def skip(self):
+        """Stop the method running now and go on with the rest in a new worker, return the stopped method"""
+        method = self.pending.pop(0)
+        if self.process.is_alive():
+            self.process.kill()
+        self.close()
+        if self.pending:
+            self.start_worker()
+        return method
+
+    def cancel(self):
+        """Stop the worker and return the methods that did not finish, the one running first"""
+        unfinished = self.pending
+        self.pending = []
+        # kill, not terminate: a worker that has only just started may not
+        # have reset the signal handlers it inherited yet
+        if self.process.is_alive():
+            self.process.kill()
+        self.close()
+        return unfinished
+
+    def close(self):
+        self.process.join(timeout=1)
+        self.conn.close()
@@ -1,63 +1,98 @@
+import math
 import random
 
+from sudokuDFS import ALL_DIGITS, POPCOUNT, box_index, grid_masks
+
+# Boards are N x N with N = n * n, n is the box size (3 for the classic 9x9)
+
 def is_valid(board, row, col, num):
+    size = len(board)
+    n = math.isqrt(size)
+
     # Check row
     if num in board[row]: return False
 
     # Check column
-    for r in range(9):
+    for r in range(size):
         if board[r][col] == num:
             return False
 
-    # Check 3×3 box
-    box_row = (row//3) * 3
-    box_col = (col//3) * 3
-    for r in range(box_row, box_row+3):
-        for c in range(box_col, box_col+3):
+    # Check n×n box
+    box_row = (row//n) * n
+    box_col = (col//n) * n
+    for r in range(box_row, box_row+n):
+        for c in range(box_col, box_col+n):
             if board[r][c] == num:
                 return False
 
     return True
 
 
-def solve_board(board):
-    for row in range(9):
-        for col in range(9):
+def solve_board(board, rng=random):
+    size = len(board)
+    for row in range(size):
+        for col in range(size):
             if board[row][col] == 0:  # empty
-                nums = list(range(1,10))
-                random.shuffle(nums)
+                nums = list(range(1,size+1))
+                rng.shuffle(nums)
                 for num in nums:
                     if is_valid(board, row, col, num):
                         board[row][col] = num
-                        if solve_board(board):
+                        if solve_board(board, rng):
                             return True
                         board[row][col] = 0
                 return False
     return True
 
 
-def generate_full_grid():
+def shuffled_pattern_grid(n, rng=random):
+    # A fixed valid pattern, randomized with transforms that keep it valid:
+    # digit relabelling, rows within bands, columns within stacks, band and
+    # stack order. Randomized backtracking gets far too slow past 9x9.
+    size = n * n
+    def shuffled(seq):
+        seq = list(seq)
+        rng.shuffle(seq)
+        return seq
+    rows = [b * n + r for b in shuffled(range(n)) for r in shuffled(range(n))]
+    cols = [s * n + c for s in shuffled(range(n)) for c in shuffled(range(n))]
+    digits = shuffled(range(1, size + 1))
+    return [[digits[(n * (r % n) + r // n + c) % size] for c in cols] for r in rows]
+
+
+# rng is the random module unless a random.Random of its own is given
+def generate_full_grid(n=3, rng=random):
+    if n != 3:
+        return shuffled_pattern_grid(n, rng)
     board = [[0 for _ in range(9)] for _ in range(9)]
-    solve_board(board)
+    solve_board(board, rng)
     return board
 
 
 
 
+# Number of clues left in a 9x9 puzzle of each difficulty
+LEVELS = {
+    "easy": 40,
+    "medium": 32,
+    "hard": 25
+}
+
+
+def clue_count(difficulty, size=9):
+    # larger boards keep the same fraction of clues as 9x9
+    return round(LEVELS[difficulty] * size * size / 81)
+
+
 def make_puzzle(board, difficulty="easy"):
-    levels = {
-        "easy": 40,
-        "medium": 32,
-        "hard": 25
-    }
-    
     puzzle = [row[:] for row in board]
+    size = len(board)
 
-    cells_to_remove = 81 - levels[difficulty]
+    cells_to_remove = size * size - clue_count(difficulty, size)
 
     while cells_to_remove > 0:
-        r = random.randint(0, 8)
-        c = random.randint(0, 8)
+        r = random.randint(0, size - 1)
+        c = random.randint(0, size - 1)
         if puzzle[r][c] != 0:
             puzzle[r][c] = 0
             cells_to_remove -= 1
@@ -65,6 +100,137 @@ def make_puzzle(board, difficulty="easy"):
     return puzzle
 
 
+
+# Uniqueness-checked generation
+# -----------------------------
+# A fast solution counter on the 9-bit row/column/box masks of sudokuDFS.
+# While removing clues, the masks and the list of empty cells are updated
+# in place instead of being rebuilt for every check.
+
+# Search effort (branching nodes) at which a puzzle stops being "easy"/"medium"
+EFFORT_LEVELS = [("easy", 0), ("medium", 8), ("hard", float("inf"))]
+
+
+def search_count(rows, cols, boxes, empties, k, limit, stats=None):
+    # count the solutions of empties[k:], stopping once limit is reached
+    if k == len(empties):
+        return 1
+
+    best = k
+    best_count = 10
+    for i in range(k, len(empties)):
+        r, c, b = empties[i]
+        count = POPCOUNT[ALL_DIGITS & ~(rows[r] | cols[c] | boxes[b])]
+        if count < best_count:
+            best, best_count = i, count
+            if count <= 1:
+                break
+
+    if stats is not None:
+        stats["nodes"] += 1
+        stats["max_depth"] = max(stats["max_depth"], k + 1)
+        if best_count > 1:
+            stats["guesses"] += 1
+    if best_count == 0:
+        return 0
+
+    empties[k], empties[best] = empties[best], empties[k]
+    r, c, b = empties[k]
+    free = ALL_DIGITS & ~(rows[r] | cols[c] | boxes[b])
+
+    found = 0
+    while free and found < limit:
+        bit = free & -free
+        free ^= bit
+        rows[r] |= bit
+        cols[c] |= bit
+        boxes[b] |= bit
+        found += search_count(rows, cols, boxes, empties, k + 1, limit - found, stats)
+        rows[r] ^= bit
+        cols[c] ^= bit
+        boxes[b] ^= bit
+    return found
+
+
+def count_solutions(board, limit=2, stats=None):
+    """Count the solutions of board, stopping early once limit is reached"""
+    masks = grid_masks(board)
+    if masks is None:
+        return 0
+    return search_count(*masks, 0, limit, stats)
+
+
+def make_unique_puzzle(board, clues=25):
+    """Remove clues from a full board while the puzzle keeps exactly one solution
+
+    Stops at the given clue count or when no remaining clue can be removed.
+    """
+    puzzle = [row[:] for row in board]
+    rows, cols, boxes, empties = grid_masks(puzzle)
+
+    cells = [(r, c) for r in range(9) for c in range(9)]
+    random.shuffle(cells)
+
+    for r, c in cells:
+        if 81 - len(empties) <= clues:
+            break
+
+        bit = 1 << (puzzle[r][c] - 1)
+        b = box_index(r, c)
+        rows[r] ^= bit
+        cols[c] ^= bit
+        boxes[b] ^= bit
+
+        # The board itself is still a solution, so the puzzle stays unique
+        # exactly when no other digit in (r, c) can be completed
+        others = ALL_DIGITS & ~(rows[r] | cols[c] | boxes[b]) & ~bit
+        unique = True
+        while others and unique:
+            alt = others & -others
+            others ^= alt
+            rows[r] |= alt
+            cols[c] |= alt
+            boxes[b] |= alt
+            if search_count(rows, cols, boxes, empties, 0, 1):
+                unique = False
+            rows[r] ^= alt
+            cols[c] ^= alt
+            boxes[b] ^= alt
+
+        if unique:
+            puzzle[r][c] = 0
+            empties.append((r, c, b))
+        else:
+            rows[r] |= bit
+            cols[c] |= bit
+            boxes[b] |= bit
+
+    return puzzle
+
+
+def rate_puzzle(puzzle):
+    """Rate a puzzle by the effort a most-constrained-cell search needs
+
+    Returns (difficulty, stats) where stats holds the search nodes, the
+    branching nodes ("guesses") and the deepest search level reached.
+    """
+    stats = {"nodes": 0, "guesses": 0, "max_depth": 0}
+    count_solutions(puzzle, 2, stats)
+    for level, max_guesses in EFFORT_LEVELS:
+        if stats["guesses"] <= max_guesses:
+            return level, stats
+
+
+def generate_unique_puzzle(difficulty="easy"):
+    """Generate a uniquely solvable puzzle with the clue count of the difficulty
+
+    Returns (puzzle, solution, (rated difficulty, stats))
+    """
+    solution = generate_full_grid()
+    puzzle = make_unique_puzzle(solution, LEVELS[difficulty])
+    return puzzle, solution, rate_puzzle(puzzle)
+
+
 #solution = generate_full_grid()
 #puzzle = make_puzzle(solution, difficulty="medium")
 
@@ -1,6 +1,21 @@
+import math
+import time
+
+from solver_stats import reset_stats
+from techniques import Propagator, fill_forced
+
+
+# Boards are N x N with N = n * n (9x9, 16x16, 25x25, ...), the box size n
+# is taken from the length of the grid
+
+
+def box_size(grid):
+    return math.isqrt(len(grid))
+
+
 def find_empty(grid):
-    for row in range(9):
-        for col in range(9):
+    for row in range(len(grid)):
+        for col in range(len(grid)):
             if grid[row][col] == 0:
                 return row, col
     return None
@@ -10,15 +25,16 @@ def is_valid(grid, row, col, num):
     if num in grid[row]:
         return False
 
-    for i in range(9):
+    for i in range(len(grid)):
         if grid[i][col] == num:
             return False
             
-    start_row = (row // 3) * 3
-    start_col = (col // 3) * 3
+    n = box_size(grid)
+    start_row = (row // n) * n
+    start_col = (col // n) * n
 
-    for i in range(start_row, start_row + 3):
-        for j in range(start_col, start_col + 3):
+    for i in range(start_row, start_row + n):
+        for j in range(start_col, start_col + n):
             if grid[i][j] == num:
                 return False
 
@@ -26,35 +42,171 @@ def is_valid(grid, row, col, num):
 
 
 
-def solve_sudoku(grid):
-    empty = find_empty(grid)
+# Number of set bits for every 9-bit digit mask, larger masks use bin()
+POPCOUNT = [bin(m).count("1") for m in range(512)]
+ALL_DIGITS = 0x1FF
 
-    if not empty:
-        return True
 
-    row, col = empty
+def box_index(row, col, n=3):
+    return (row // n) * n + col // n
 
-    for num in range(1, 10):  
-        if is_valid(grid, row, col, num):
-            grid[row][col] = num  
 
-            if solve_sudoku(grid):
-                return True
+def iter_masks(grid, rows, cols, boxes, empties, k=0, stats=None, all_digits=ALL_DIGITS):
+    # empties[:k] are already filled, pick the remaining (row, col, box)
+    # with fewest candidates. Yields grid at every complete assignment and
+    # carries on searching when resumed; a generator that is closed or
+    # dropped at a solution leaves it in grid
+    if k == len(empties):
+        yield grid
+        return
 
-            grid[row][col] = 0  
+    if stats is not None:
+        stats["nodes"] += 1
+        if k + 1 > stats["max_depth"]:
+            stats["max_depth"] = k + 1
 
-    return False
+    best = k
+    best_count = len(grid) + 1
+    for i in range(k, len(empties)):
+        row, col, box = empties[i]
+        free = all_digits & ~(rows[row] | cols[col] | boxes[box])
+        count = POPCOUNT[free] if free < 512 else bin(free).count("1")
+        if count < best_count:
+            best, best_count = i, count
+            if count <= 1:
+                break
 
+    if best_count == 0:
+        return
 
-def print_grid(grid):
-    for i in range(9):
-        if i % 3 == 0 and i != 0:
-            print("- - - - - - - - - - -")
+    empties[k], empties[best] = empties[best], empties[k]
+    row, col, box = empties[k]
+    free = all_digits & ~(rows[row] | cols[col] | boxes[box])
+
+    while free:
+        bit = free & -free
+        free ^= bit
+
+        grid[row][col] = bit.bit_length()
+        rows[row] |= bit
+        cols[col] |= bit
+        boxes[box] |= bit
+
+        yield from iter_masks(grid, rows, cols, boxes, empties, k + 1, stats, all_digits)
+
+        if stats is not None:
+            stats["backtracks"] += 1
+        rows[row] ^= bit
+        cols[col] ^= bit
+        boxes[box] ^= bit
+
+    grid[row][col] = 0
 
-        for j in range(9):
-            if j % 3 == 0 and j != 0:
+
+def solve_masks(grid, rows, cols, boxes, empties, k=0, stats=None, all_digits=ALL_DIGITS):
+    # the first solution of iter_masks, left in grid
+    return next(iter_masks(grid, rows, cols, boxes, empties, k, stats, all_digits), None) is not None
+
+
+def grid_masks(grid):
+    # (rows, cols, boxes, empties) of a grid, or None if its clues conflict
+    size = len(grid)
+    n = box_size(grid)
+    rows = [0] * size
+    cols = [0] * size
+    boxes = [0] * size
+    empties = []
+
+    for row in range(size):
+        for col in range(size):
+            box = box_index(row, col, n)
+            num = grid[row][col]
+            if num == 0:
+                empties.append((row, col, box))
+                continue
+
+            bit = 1 << (num - 1)
+            # the given clues already conflict
+            if (rows[row] | cols[col] | boxes[box]) & bit:
+                return None
+            rows[row] |= bit
+            cols[col] |= bit
+            boxes[box] |= bit
+
+    return rows, cols, boxes, empties
+
+
+def solve_grid(grid, stats=None):
+    # fetch the rows once, a Board hands out a new row view on every grid[row]
+    grid = list(grid)
+    masks = grid_masks(grid)
+    if masks is None:
+        return False
+    return solve_masks(grid, *masks, 0, stats, (1 << len(grid)) - 1)
+
+
+def solve_sudoku(grid, stats=None, techniques=None):
+    """Fill grid in place, returning True if it was solved
+
+    If a stats dict is given it is reset and filled with the counters
+    described in solver_stats. techniques names techniques.TECHNIQUES to
+    fill forced cells with before the search starts.
+    """
+    if stats is not None:
+        reset_stats(stats)
+        start = time.perf_counter_ns()
+
+    if techniques is None:
+        solved = solve_grid(grid, stats)
+    else:
+        original = [list(row) for row in grid]
+        propagator = Propagator(box_size(grid), techniques)
+        solved = fill_forced(grid, propagator)
+        if stats is not None:
+            stats["techniques"] = dict(propagator.fired)
+            stats["propagation_ns"] = time.perf_counter_ns() - start
+        solved = solved and solve_grid(grid, stats)
+        if not solved:
+            grid[:] = original
+
+    if stats is not None:
+        stats["search_ns"] = time.perf_counter_ns() - start - stats["propagation_ns"]
+    return solved
+
+
+def iter_solutions(grid, stats=None):
+    """Fill grid in place with every solution in turn, yielding it each time
+
+    The search is suspended between solutions, so the caller decides how
+    many to look at. grid is back to the puzzle once the generator finishes
+    or is closed. A stats dict gets the search counters of solver_stats.
+    """
+    if stats is not None:
+        reset_stats(stats)
+    lines = list(grid)
+    masks = grid_masks(lines)
+    if masks is None:
+        return
+    empties = list(masks[3])
+    try:
+        for _ in iter_masks(lines, *masks, 0, stats, (1 << len(lines)) - 1):
+            yield grid
+    finally:
+        for row, col, _ in empties:
+            lines[row][col] = 0
+
+
+def print_grid(grid):
+    n = box_size(grid)
+    width = len(str(len(grid)))
+    for i in range(len(grid)):
+        if i % n == 0 and i != 0:
+            print("- " * ((len(grid) + n - 1) * width))
+
+        for j in range(len(grid)):
+            if j % n == 0 and j != 0:
                 print("|", end=" ")
 
-            print(grid[i][j], end=" ")
+            print(str(grid[i][j]).rjust(width), end=" ")
         print()
 
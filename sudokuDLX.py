@@ -0,0 +1,206 @@
+import time
+
+from solver_stats import reset_stats
+
+# Sudoku as an exact cover problem solved with Knuth's Algorithm X
+# on dancing links. Every candidate (row, col, digit) is a row of the
+# cover matrix and satisfies 4 of the 324 constraint columns:
+#   cell (r, c) filled, digit d in row r, digit d in col c, digit d in box b
+
+N_COLUMNS = 324
+
+
+def candidate_columns(row, col, digit):
+    box = (row // 3) * 3 + col // 3
+    d = digit - 1
+    return [1 + row * 9 + col,
+            1 + 81 + row * 9 + d,
+            1 + 162 + col * 9 + d,
+            1 + 243 + box * 9 + d]
+
+
+def build_links():
+    # node 0 is the root, nodes 1..324 are the column headers
+    left = [i - 1 for i in range(N_COLUMNS + 1)]
+    right = [i + 1 for i in range(N_COLUMNS + 1)]
+    left[0] = N_COLUMNS
+    right[N_COLUMNS] = 0
+    up = list(range(N_COLUMNS + 1))
+    down = list(range(N_COLUMNS + 1))
+    column = list(range(N_COLUMNS + 1))
+    candidate = [-1] * (N_COLUMNS + 1)
+    size = [0] * (N_COLUMNS + 1)
+    first_node = []
+
+    for row in range(9):
+        for col in range(9):
+            for digit in range(1, 10):
+                first = len(left)
+                first_node.append(first)
+                for k, c in enumerate(candidate_columns(row, col, digit)):
+                    node = first + k
+                    left.append(node - 1 if k > 0 else first + 3)
+                    right.append(node + 1 if k < 3 else first)
+                    # append at the bottom of column c
+                    up.append(up[c])
+                    down.append(c)
+                    down[up[c]] = node
+                    up[c] = node
+                    column.append(c)
+                    candidate.append((row, col, digit))
+                    size[c] += 1
+
+    return left, right, up, down, column, candidate, size, first_node
+
+
+# The full cover matrix never changes, so it is built once and copied per solve
+LINKS = build_links()
+
+
+def prepare(grid):
+    # Copy the cover matrix and select the clues of grid. Returns the links
+    # with their cover and uncover operations, or None if two clues conflict
+    left, right, up, down, column, candidate, size = (list(a) for a in LINKS[:7])
+    first_node = LINKS[7]
+
+    def cover(c):
+        right[left[c]] = right[c]
+        left[right[c]] = left[c]
+        i = down[c]
+        while i != c:
+            j = right[i]
+            while j != i:
+                down[up[j]] = down[j]
+                up[down[j]] = up[j]
+                size[column[j]] -= 1
+                j = right[j]
+            i = down[i]
+
+    def uncover(c):
+        i = up[c]
+        while i != c:
+            j = left[i]
+            while j != i:
+                size[column[j]] += 1
+                down[up[j]] = j
+                up[down[j]] = j
+                j = left[j]
+            i = up[i]
+        right[left[c]] = c
+        left[right[c]] = c
+
+    # select the rows of the given clues before searching
+    covered = set()
+    for row in range(9):
+        for col in range(9):
+            digit = grid[row][col]
+            if digit == 0:
+                continue
+            node = first_node[(row * 9 + col) * 9 + digit - 1]
+            cols = [column[node + k] for k in range(4)]
+            # the clue shares a constraint with an earlier clue
+            if covered.intersection(cols):
+                return None
+            for c in cols:
+                covered.add(c)
+                cover(c)
+
+    return (left, right, up, down, column, candidate, size), cover, uncover
+
+
+def searcher(prepared, stats=None):
+    # Algorithm X on prepared links. Returns a generator function that yields
+    # the chosen (row, col, digit) candidates at every exact cover and carries
+    # on searching when resumed
+    (left, right, up, down, column, candidate, size), cover, uncover = prepared
+    solution = []
+
+    def search(depth=1):
+        if right[0] == 0:
+            yield solution
+            return
+
+        if stats is not None:
+            stats["nodes"] += 1
+            if depth > stats["max_depth"]:
+                stats["max_depth"] = depth
+
+        # column with the fewest remaining candidates
+        best = right[0]
+        c = right[best]
+        while c != 0:
+            if size[c] < size[best]:
+                best = c
+                if size[c] <= 1:
+                    break
+            c = right[c]
+        if size[best] == 0:
+            return
+
+        cover(best)
+        r = down[best]
+        while r != best:
+            solution.append(candidate[r])
+            j = right[r]
+            while j != r:
+                cover(column[j])
+                j = right[j]
+
+            yield from search(depth + 1)
+
+            if stats is not None:
+                stats["backtracks"] += 1
+
+            j = left[r]
+            while j != r:
+                uncover(column[j])
+                j = left[j]
+            solution.pop()
+            r = down[r]
+        uncover(best)
+
+    return search
+
+
+def solve_sudoku(grid, stats=None):
+    if stats is not None:
+        reset_stats(stats)
+        start = time.perf_counter_ns()
+
+    prepared = prepare(grid)
+    if prepared is None:
+        return False
+
+    solution = next(searcher(prepared, stats)(), None)
+    if stats is not None:
+        stats["search_ns"] = time.perf_counter_ns() - start
+    if solution is None:
+        return False
+
+    for row, col, digit in solution:
+        grid[row][col] = digit
+    return True
+
+
+def iter_solutions(grid, stats=None):
+    """Fill grid in place with every solution in turn, yielding it each time
+
+    The search is suspended between solutions, and grid is back to the
+    puzzle once the generator finishes or is closed.
+    """
+    if stats is not None:
+        reset_stats(stats)
+
+    prepared = prepare(grid)
+    if prepared is None:
+        return
+
+    empties = [(row, col) for row in range(9) for col in range(9) if grid[row][col] == 0]
+    try:
+        for found in searcher(prepared, stats)():
+            for row, col, digit in found:
+                grid[row][col] = digit
+            yield grid
+    finally:
+        for row, col in empties:
+            grid[row][col] = 0
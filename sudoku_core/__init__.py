@@ -0,0 +1,149 @@
+"""Headless solver core
+
+    from sudoku_core import solve
+    solved = solve(grid, engine="dlx")
+
+Importing this package loads neither pygame nor NumPy. Every engine module
+is imported the first time the engine is used, and NumPy only comes in
+with the CSP engine. Grids are a board.Board or a list of lists.
+"""
+
+from itertools import islice
+
+from board import Board, copy_grid
+
+# Every engine fills grid in place, returns whether it was solved, and
+# fills the solver_stats counters when given a stats dict. DFS and CSP also
+# take the names of techniques.TECHNIQUES to propagate with before branching,
+# and CSP takes the SudokoCSP search options (variable_order, value_order,
+# restart_nodes, seed, backjump, nogood_size, max_nogoods) as keywords
+
+
+def solve_dfs(grid, stats=None, techniques=None):
+    from sudokuDFS import solve_sudoku
+    return solve_sudoku(grid, stats, techniques)
+
+
+def solve_csp(grid, stats=None, techniques=None, **options):
+    import numpy as np
+    from CSP import SudokoCSP
+
+    if isinstance(grid, Board):
+        # the CSP searches a NumPy view of the board's own bytes
+        return SudokoCSP(grid.array(), stats=stats, techniques=techniques, **options).solve(verbose=False)
+
+    csp = SudokoCSP(np.array(grid), stats=stats, techniques=techniques, **options)
+    if csp.solve(verbose=False):
+        grid[:] = csp.grid.tolist()
+        return True
+    return False
+
+
+def solve_dlx(grid, stats=None):
+    from sudokuDLX import solve_sudoku
+    if len(grid) != 9:
+        raise ValueError("the DLX engine only supports 9x9 boards")
+    return solve_sudoku(grid, stats)
+
+
+ENGINES = {
+    "dfs": solve_dfs,
+    "csp": solve_csp,
+    "dlx": solve_dlx,
+}
+
+
+def warm_engines():
+    """Import every engine now, so no timed solve pays for the imports later"""
+    import CSP  # noqa: F401
+    import sudokuDFS  # noqa: F401
+    import sudokuDLX  # noqa: F401
+
+
+# Solution iterators: fill grid in place with every solution in turn,
+# yielding it each time, and leave the puzzle behind when closed
+
+
+def iter_dfs(grid, stats=None):
+    from sudokuDFS import iter_solutions
+    return iter_solutions(grid, stats)
+
+
+def iter_csp(grid, stats=None):
+    import numpy as np
+    from CSP import SudokoCSP
+
+    if isinstance(grid, Board):
+        yield from SudokoCSP(grid.array(), stats=stats).iter_solutions()
+        return
+
+    original = [row[:] for row in grid]
+    try:
+        for solution in SudokoCSP(np.array(grid), stats=stats).iter_solutions():
+            grid[:] = solution.tolist()
+            yield grid
+    finally:
+        grid[:] = original
+
+
+def iter_dlx(grid, stats=None):
+    from sudokuDLX import iter_solutions
+    if len(grid) != 9:
+        raise ValueError("the DLX engine only supports 9x9 boards")
+    return iter_solutions(grid, stats)
+
+
+ITERATORS = {
+    "dfs": iter_dfs,
+    "csp": iter_csp,
+    "dlx": iter_dlx,
+}
+
+
+def get_iterator(engine):
+    try:
+        return ITERATORS[engine]
+    except KeyError:
+        raise ValueError(f"unknown engine {engine!r}, expected one of {sorted(ITERATORS)}") from None
+
+
+def solve(grid, engine="dfs", stats=None, techniques=None, **options):
+    """Solve grid (a Board or a list of lists, 0 for empty cells) in place with the named engine
+
+    Returns True if the grid was solved. options are search options of the
+    CSP engine, e.g. variable_order="dom_wdeg", value_order="lcv".
+    """
+    try:
+        solver = ENGINES[engine]
+    except KeyError:
+        raise ValueError(f"unknown engine {engine!r}, expected one of {sorted(ENGINES)}") from None
+    if options:
+        if engine != "csp":
+            raise ValueError(f"the {engine} engine takes no search options")
+        return solver(grid, stats, techniques, **options)
+    if techniques is None:
+        return solver(grid, stats)
+    if engine == "dlx":
+        raise ValueError("the DLX engine does not take propagation techniques")
+    return solver(grid, stats, techniques)
+
+
+def iter_solutions(grid, engine="dfs", stats=None):
+    """Yield the solutions of grid one at a time, each as a new grid of the same type
+
+    The engine's search is suspended between solutions and resumed for the
+    next one, so only the solutions taken are ever found. grid itself is not
+    changed.
+    """
+    iterator = get_iterator(engine)
+    for solution in iterator(copy_grid(grid), stats):
+        yield copy_grid(solution)
+
+
+def count_solutions(grid, limit=2, engine="dfs", stats=None):
+    """Count the solutions of grid, stopping as soon as limit are found
+
+    count_solutions(grid) == 1 checks that a puzzle has a unique solution.
+    """
+    iterator = get_iterator(engine)
+    return sum(1 for _ in islice(iterator(copy_grid(grid), stats), limit))
@@ -0,0 +1,265 @@
+from collections import Counter
+from itertools import combinations
+
+# Human solving techniques as a propagation stage in front of search.
+#
+# Every technique works on domains, a dict of cell -> int bitset (bit v - 1
+# set when value v is possible) holding the cells still to fill, and removes
+# values through prune(cell, bits) so the caller can record them (the CSP
+# trail) or simply apply them. A technique returns how many removals it made.
+
+
+def bit_count(bits):
+    return bin(bits).count("1")
+
+
+def single_bits(bits):
+    while bits:
+        bit = bits & -bits
+        bits ^= bit
+        yield bit
+
+
+def make_units(n):
+    size = n * n
+    rows = [[(r, c) for c in range(size)] for r in range(size)]
+    cols = [[(r, c) for r in range(size)] for c in range(size)]
+    boxes = [[(br * n + i, bc * n + j) for i in range(n) for j in range(n)]
+             for br in range(n) for bc in range(n)]
+    return {
+        "n": n,
+        "size": size,
+        "all_values": (1 << size) - 1,
+        "rows": rows,
+        "cols": cols,
+        "boxes": boxes,
+        "all": rows + cols + boxes,
+    }
+
+
+def box_of(cell, n):
+    return (cell[0] // n) * n + cell[1] // n
+
+
+def hidden_single(domains, units, prune):
+    # a value with one possible cell left in a unit goes there
+    removed = 0
+    for unit in units["all"]:
+        cells = [cell for cell in unit if cell in domains]
+        once = more = 0
+        for cell in cells:
+            more |= once & domains[cell]
+            once |= domains[cell]
+        only = once & ~more
+        if not only:
+            continue
+        for cell in cells:
+            domain = domains[cell]
+            hit = domain & only
+            if hit and domain != hit:
+                # two values that both need this cell leave it empty
+                prune(cell, domain if hit & (hit - 1) else domain & ~hit)
+                removed += 1
+    return removed
+
+
+def naked_subset(domains, units, prune, k):
+    # k cells of a unit sharing k values between them: no other cell of
+    # the unit can take those values
+    removed = 0
+    for unit in units["all"]:
+        cells = [cell for cell in unit if cell in domains]
+        candidates = [cell for cell in cells if 2 <= bit_count(domains[cell]) <= k]
+        for subset in combinations(candidates, k):
+            values = 0
+            for cell in subset:
+                values |= domains[cell]
+            if bit_count(values) != k:
+                continue
+            for cell in cells:
+                if cell not in subset and domains[cell] & values:
+                    prune(cell, domains[cell] & values)
+                    removed += 1
+    return removed
+
+
+def hidden_subset(domains, units, prune, k):
+    # k values of a unit confined to the same k cells: those cells can
+    # take no other value
+    removed = 0
+    for unit in units["all"]:
+        cells = [cell for cell in unit if cell in domains]
+        places = {}
+        for bit in single_bits(units["all_values"]):
+            where = frozenset(cell for cell in cells if domains[cell] & bit)
+            if 2 <= len(where) <= k:
+                places[bit] = where
+        for subset in combinations(places, k):
+            where = frozenset().union(*(places[bit] for bit in subset))
+            if len(where) != k:
+                continue
+            values = sum(subset)
+            for cell in where:
+                if domains[cell] & ~values:
+                    prune(cell, domains[cell] & ~values)
+                    removed += 1
+    return removed
+
+
+def pointing(domains, units, prune):
+    # a value confined to one row (or column) inside a box is removed from
+    # the rest of that row (column)
+    removed = 0
+    for box in units["boxes"]:
+        cells = [cell for cell in box if cell in domains]
+        for bit in single_bits(units["all_values"]):
+            where = [cell for cell in cells if domains[cell] & bit]
+            if len(where) < 2:
+                continue
+            for axis, lines in ((0, units["rows"]), (1, units["cols"])):
+                if all(cell[axis] == where[0][axis] for cell in where):
+                    for cell in lines[where[0][axis]]:
+                        if cell in domains and cell not in box and domains[cell] & bit:
+                            prune(cell, bit)
+                            removed += 1
+    return removed
+
+
+def claiming(domains, units, prune):
+    # a value confined to one box inside a row (or column) is removed from
+    # the rest of that box
+    removed = 0
+    n = units["n"]
+    for line in units["rows"] + units["cols"]:
+        cells = [cell for cell in line if cell in domains]
+        for bit in single_bits(units["all_values"]):
+            where = [cell for cell in cells if domains[cell] & bit]
+            if len(where) < 2:
+                continue
+            box = box_of(where[0], n)
+            if all(box_of(cell, n) == box for cell in where):
+                for cell in units["boxes"][box]:
+                    if cell in domains and cell not in line and domains[cell] & bit:
+                        prune(cell, bit)
+                        removed += 1
+    return removed
+
+
+def x_wing(domains, units, prune):
+    # a value with exactly two places in each of two rows, in the same two
+    # columns, is removed from the rest of those columns (and rows/columns
+    # swapped)
+    removed = 0
+    for bit in single_bits(units["all_values"]):
+        for axis, lines, crossing in ((1, units["rows"], units["cols"]),
+                                      (0, units["cols"], units["rows"])):
+            by_pair = {}
+            for index, line in enumerate(lines):
+                where = tuple(cell[axis] for cell in line if cell in domains and domains[cell] & bit)
+                if len(where) == 2:
+                    by_pair.setdefault(where, []).append(index)
+            for pair, found in by_pair.items():
+                if len(found) != 2:
+                    continue
+                for cross in pair:
+                    for cell in crossing[cross]:
+                        if cell[1 - axis] in found or cell not in domains:
+                            continue
+                        if domains[cell] & bit:
+                            prune(cell, bit)
+                            removed += 1
+    return removed
+
+
+# Cheapest first, the propagator restarts from the top after every success
+TECHNIQUES = {
+    "hidden_single": hidden_single,
+    "naked_pair": lambda domains, units, prune: naked_subset(domains, units, prune, 2),
+    "hidden_pair": lambda domains, units, prune: hidden_subset(domains, units, prune, 2),
+    "pointing": pointing,
+    "claiming": claiming,
+    "naked_triple": lambda domains, units, prune: naked_subset(domains, units, prune, 3),
+    "hidden_triple": lambda domains, units, prune: hidden_subset(domains, units, prune, 3),
+    "x_wing": x_wing,
+}
+ALL_TECHNIQUES = tuple(TECHNIQUES)
+
+
+class Propagator:
+    """Run the enabled techniques to a fixpoint
+
+    fired counts the removals made by each technique over the propagator's
+    lifetime.
+    """
+
+    def __init__(self, n=3, techniques=ALL_TECHNIQUES):
+        unknown = set(techniques) - set(TECHNIQUES)
+        if unknown:
+            raise ValueError(f"unknown techniques {sorted(unknown)}, expected some of {list(TECHNIQUES)}")
+        self.techniques = [(name, TECHNIQUES[name]) for name in TECHNIQUES if name in techniques]
+        self.units = make_units(n)
+        self.fired = Counter()
+
+    def run(self, domains, prune):
+        """Return the set of cells whose domain changed, or None if a domain emptied"""
+        changed = set()
+
+        def tracked_prune(cell, bits):
+            prune(cell, bits)
+            changed.add(cell)
+
+        progress = True
+        while progress:
+            progress = False
+            for name, technique in self.techniques:
+                removed = technique(domains, self.units, tracked_prune)
+                if removed:
+                    self.fired[name] += removed
+                    if any(domains[cell] == 0 for cell in changed):
+                        return None
+                    progress = True
+                    break
+        return changed
+
+
+def fill_forced(grid, propagator):
+    """Fill every cell of grid that the techniques and naked singles force
+
+    Returns False if the grid turns out to be unsolvable.
+    """
+    size = len(grid)
+    n = propagator.units["n"]
+    all_values = propagator.units["all_values"]
+    while True:
+        rows = [0] * size
+        cols = [0] * size
+        boxes = [0] * size
+        for r in range(size):
+            for c in range(size):
+                if grid[r][c]:
+                    bit = 1 << (grid[r][c] - 1)
+                    rows[r] |= bit
+                    cols[c] |= bit
+                    boxes[box_of((r, c), n)] |= bit
+        domains = {(r, c): all_values & ~(rows[r] | cols[c] | boxes[box_of((r, c), n)])
+                   for r in range(size) for c in range(size) if grid[r][c] == 0}
+        if any(domain == 0 for domain in domains.values()):
+            return False
+
+        def prune(cell, bits):
+            domains[cell] &= ~bits
+
+        if propagator.run(domains, prune) is None:
+            return False
+
+        singles = [(cell, domain) for cell, domain in domains.items() if domain & (domain - 1) == 0]
+        if not singles:
+            return True
+        for (r, c), bit in singles:
+            b = box_of((r, c), n)
+            if (rows[r] | cols[c] | boxes[b]) & bit:
+                return False
+            rows[r] |= bit
+            cols[c] |= bit
+            boxes[b] |= bit
+            grid[r][c] = bit.bit_length()